@@ -4,14 +4,36 @@ import sys
 import re
 import json
 import csv
+import datetime
+import io
+import mmap
+import copy
+import decimal
 import logging
+import functools
 import itertools
+import shutil
+import tempfile
+import concurrent.futures
+import multiprocessing
 from collections import UserString
 import sqlite3
+import dateutil.parser
 
 from deriva.core import DerivaServer, get_credential, urlquote, topo_sorted, tag, DEFAULT_SESSION_CONFIG
 from deriva.core.ermrest_model import Model, Table, Column, Key, ForeignKey, builtin_types
 import requests
+import requests.adapters
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
 
 from . import tableschema
 from .tableschema import PackageDataName, submission_schema_json, constituent_schema_json, portal_prep_schema_json, portal_schema_json, registry_schema_json
@@ -41,6 +63,12 @@ if 'cfde_resource_src_rmt' not in tag:
 def sql_identifier(s):
     return '"%s"' % (s.replace('"', '""'),)
 
+def sql_qualified(schema, name):
+    """Return optionally schema-qualified SQL identifier."""
+    if schema is None:
+        return sql_identifier(name)
+    return '%s.%s' % (sql_identifier(schema), sql_identifier(name))
+
 def sql_literal(s):
     if isinstance(s, str):
         return "'%s'" % (s.replace("'", "''"),)
@@ -49,6 +77,64 @@ def sql_literal(s):
     else:
         raise TypeError('Unexpected type %s in sql_literal(%r)' % (type(s), s))
 
+def sqlite_tune_bulk(conn, schemas=('main',)):
+    """Apply PRAGMAs favoring bulk-load throughput on an open sqlite3 connection.
+
+    :param conn: The sqlite3 connection, which must not be in a transaction.
+    :param schemas: Database names to tune, i.e. main and any attached dbs.
+
+    WAL with synchronous=NORMAL avoids an fsync per commit while
+    remaining safe against corruption, and a large page cache keeps
+    B-tree updates in memory during loads and ETL.
+
+    A database created by this connection gets 16 KiB pages, for
+    fewer and shallower B-tree pages with our wide rows, and reads of
+    existing content go through a memory map rather than read() calls.
+    """
+    for schema in schemas:
+        qschema = sql_identifier(schema)
+        # only effective before the first write, so must precede journal_mode
+        conn.execute('PRAGMA %s.page_size=16384;' % qschema)
+        conn.execute('PRAGMA %s.journal_mode=WAL;' % qschema)
+        conn.execute('PRAGMA %s.synchronous=NORMAL;' % qschema)
+        conn.execute('PRAGMA %s.cache_size=-262144;' % qschema)
+        conn.execute('PRAGMA %s.mmap_size=1073741824;' % qschema)
+    conn.execute('PRAGMA temp_store=MEMORY;')
+
+def json_loads(s):
+    """Decode JSON str or bytes, using orjson if available."""
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+def json_dumps(v):
+    """Encode v as compact JSON str, using orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(v).decode()
+    return json.dumps(v, separators=(',',':'))
+
+def response_json(r):
+    """Decode JSON content of a requests response, using orjson if available."""
+    if orjson is not None:
+        return orjson.loads(r.content)
+    return r.json()
+
+def parse_timestamp(s):
+    """Parse an ERMrest timestamptz string, e.g. "2021-05-04T18:27:43.123456-07:00"
+
+    Uses the C datetime.fromisoformat() and only falls back to the
+    much slower dateutil parser for forms it does not accept.
+    """
+    try:
+        return datetime.datetime.fromisoformat(s.replace('Z', '+00:00'))
+    except ValueError:
+        return dateutil.parser.parse(s)
+
+def make_parent_dirs(*filenames):
+    """Idempotently create the parent directories of filenames."""
+    for filename in filenames:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
 def make_session_config():
     """Return custom requests session_config for our data submission scenarios
     """
@@ -64,6 +150,26 @@ def make_session_config():
     })
     return session_config
 
+def widen_session_pool(binding, pool_maxsize=20):
+    """Remount binding's HTTP adapters with a larger keep-alive connection pool.
+
+    :param binding: A DerivaServer, ErmrestCatalog, or similar deriva binding.
+    :param pool_maxsize: Connections to keep per host (default 20).
+
+    The session's existing retry policy is preserved. This lets
+    concurrent callers sharing one binding reuse connections rather
+    than discarding them when the default pool of 10 overflows.
+    """
+    session = binding._session
+    for prefix in ('https://', 'http://'):
+        adapter = session.get_adapter(prefix)
+        session.mount(prefix, requests.adapters.HTTPAdapter(
+            pool_connections=pool_maxsize,
+            pool_maxsize=pool_maxsize,
+            max_retries=adapter.max_retries,
+        ))
+    return binding
+
 def tables_topo_sorted(tables):
     """Return tables topologically sorted to put dependant after references tables.
 
@@ -92,6 +198,38 @@ def tables_topo_sorted(tables):
         })
     ]
 
+def tables_topo_levels(tables):
+    """Return tables grouped into levels by foreign key dependency.
+
+    :param tables: iterable of table instances
+
+    Each level is a list of tables which only reference tables in
+    earlier levels, so the tables within one level can be loaded
+    concurrently.
+    """
+    tables = tables_topo_sorted(tables)
+    def tname(table):
+        return (
+            table.schema.name,
+            table.name
+        )
+    def target_tname(fkey):
+        return (
+            fkey.referenced_columns[0].table.schema.name,
+            fkey.referenced_columns[0].table.name
+        )
+    levels = {}
+    for table in tables:
+        levels[tname(table)] = 1 + max([
+            levels[target_tname(fkey)]
+            for fkey in table.foreign_keys
+            if target_tname(fkey) != tname(table) and target_tname(fkey) in levels
+        ], default=-1)
+    result = [ [] for i in range(1 + max(levels.values(), default=-1)) ]
+    for table in tables:
+        result[levels[tname(table)]].append(table)
+    return result
+
 class CfdeDataPackage (object):
     # the translation stores frictionless table resource metadata under this annotation
     resource_tag = 'tag:isrd.isi.edu,2019:table-resource'
@@ -100,7 +238,9 @@ class CfdeDataPackage (object):
     schema_tag = 'tag:isrd.isi.edu,2019:table-schema-leftovers'
 
     batch_size = 2000 # how may rows we'll send to ermrest
+    sqlite_batch_size = 10000 # how many rows we'll bind per sqlite executemany
     batch_bytes_limit = 256*1024 # 0.25MB
+    read_buffer_size = 1024*1024 # 1MB of TSV per read() syscall
 
     def __init__(self, package_filename, configurator=None):
         """Construct CfdeDataPackage from given package definition filename.
@@ -126,13 +266,12 @@ class CfdeDataPackage (object):
 
         # load 2 copies... first is mutated during translation
         if isinstance(package_filename, PackageDataName):
-            package_def = json.loads(package_filename.get_data_str())
-            self.package_def = json.loads(package_filename.get_data_str())
+            buf = package_filename.get_data()
         else:
-            with open(self.package_filename, 'r') as f:
-                package_def = json.load(f)
-            with open(self.package_filename, 'r') as f:
-                self.package_def = json.load(f)
+            with open(self.package_filename, 'rb') as f:
+                buf = f.read()
+        package_def = json_loads(buf)
+        self.package_def = json_loads(buf)
 
         self.model_doc = tableschema.make_model(package_def, configurator=self.configurator, trusted=isinstance(self.package_filename, PackageDataName))
         self.doc_model_root = Model(None, self.model_doc)
@@ -141,6 +280,36 @@ class CfdeDataPackage (object):
         if not set(self.model_doc['schemas']).issubset({'CFDE', 'public', 'c2m2'}):
             raise ValueError('Unexpected schema set in data package: %s' % (set(self.model_doc['schemas']),))
 
+    @classmethod
+    def from_file_cached(cls, package_filename):
+        """Return a shared CfdeDataPackage for package_filename, parsed once per process.
+
+        The parsed package and its model are reused for as long as
+        the file's size and mtime are unchanged. Callers MUST treat
+        the result as read-only, i.e. not bind it to a catalog or
+        otherwise mutate it.
+        """
+        st = os.stat(package_filename)
+        return cls._from_file_cached(package_filename, st.st_size, st.st_mtime_ns)
+
+    @classmethod
+    @functools.lru_cache(maxsize=8)
+    def _from_file_cached(cls, package_filename, size, mtime_ns):
+        return cls(package_filename)
+
+    def for_catalog(self, catalog, registry=None):
+        """Return a copy of this datapackage bound to catalog.
+
+        The copy shares the parsed package definition and model
+        documents, which callers must treat as read-only, but gets its
+        own default configurator and catalog state. Use this on a
+        shared, unbound instance to avoid re-parsing the package.
+        """
+        dp = copy.copy(self)
+        dp.configurator = type(self.configurator)()
+        dp.set_catalog(catalog, registry)
+        return dp
+
     def set_catalog(self, catalog, registry=None):
         self.catalog = catalog
         self.configurator.set_catalog(catalog, registry)
@@ -271,39 +440,48 @@ class CfdeDataPackage (object):
         """Provision model idempotently in self.catalog"""
         need_parts = []
 
-        # create empty schemas if missing
+        def base_table_doc(nschema, ntable):
+            # stripped of fkeys and acl-bindings which might be incoherent
+            tdoc = ntable.prejson()
+            tdoc.pop("foreign_keys")
+            tdoc.pop("acl_bindings")
+            for cdoc in tdoc["column_definitions"]:
+                cdoc.pop("acl_bindings")
+            tdoc.update({"schema_name": nschema.name, "table_name": ntable.name})
+            return tdoc
+
+        # create missing schemas with their base tables in one request
+        # which is the whole model for a freshly created catalog
         for nschema in self.doc_model_root.schemas.values():
             if nschema.name not in self.cat_model_root.schemas:
                 sdoc = nschema.prejson()
-                del sdoc['tables']
+                sdoc['tables'] = {
+                    ntable.name: base_table_doc(nschema, ntable)
+                    for ntable in nschema.tables.values()
+                }
                 sdoc.update({"schema_name": nschema.name})
                 need_parts.append(sdoc)
 
-        if need_parts:
-            self.catalog.post('/schema', json=need_parts).raise_for_status()
-            logger.info("Added empty schemas %r" % ([ sdoc["schema_name"] for sdoc in need_parts ]))
-            need_parts.clear()
-            self.get_model()
-
-        # create tables if missing, but stripped of fkeys and acl-bindings which might be incoherent
+        # create tables if missing in existing schemas
         for nschema in self.doc_model_root.schemas.values():
-            schema = self.cat_model_root.schemas[nschema.name]
+            schema = self.cat_model_root.schemas.get(nschema.name)
+            if schema is None:
+                continue
             for ntable in nschema.tables.values():
                 if ntable.name not in schema.tables:
-                    tdoc = ntable.prejson()
-                    tdoc.pop("foreign_keys")
-                    tdoc.pop("acl_bindings")
-                    for cdoc in tdoc["column_definitions"]:
-                        cdoc.pop("acl_bindings")
-                    tdoc.update({"schema_name": nschema.name, "table_name": ntable.name})
-                    need_parts.append(tdoc)
+                    need_parts.append(base_table_doc(nschema, ntable))
 
         if need_parts:
             self.catalog.post('/schema', json=need_parts).raise_for_status()
-            logger.info("Added base tables %r" % ([ (tdoc["schema_name"], tdoc["table_name"]) for tdoc in need_parts ]))
+            logger.info("Added schemas and base tables %r" % ([
+                (doc["schema_name"], doc.get("table_name")) for doc in need_parts
+            ]))
             need_parts.clear()
             self.get_model()
 
+        # only refresh our copy of the catalog model after steps which changed it
+        changed = False
+
         # create and/or upgrade columns, but stripped of acl-bindings which might be incoherent
         for nschema in self.doc_model_root.schemas.values():
             schema = self.cat_model_root.schemas[nschema.name]
@@ -328,6 +506,7 @@ class CfdeDataPackage (object):
                             json=cdoc
                         ).raise_for_status()
                         logger.info("Added column %s.%s.%s" % (nschema.name, ntable.name, ncolumn.name))
+                        changed = True
 
                         # apply built-in upgrade data to new column
                         if upgrade_data_path and isinstance(self.package_filename, PackageDataName):
@@ -423,7 +602,10 @@ class CfdeDataPackage (object):
                             logger.info("Altered column %s.%s.%s with changes %r" % (
                                 nschema.name, ntable.name, ncolumn.name, change,
                             ))
-        self.get_model()
+                            changed = True
+        if changed:
+            self.get_model()
+            changed = False
 
         # create and/or upgrade keys
         for nschema in self.doc_model_root.schemas.values():
@@ -436,7 +618,10 @@ class CfdeDataPackage (object):
                     if key is None:
                         key = table.create_key(nkey.prejson())
                         logger.info("Created key %s" % (key.constraint_name,))
-        self.get_model()
+                        changed = True
+        if changed:
+            self.get_model()
+            changed = False
 
         # purge keys that no longer exist
         for nschema in self.doc_model_root.schemas.values():
@@ -451,7 +636,10 @@ class CfdeDataPackage (object):
                     if nkey is None:
                         key.drop()
                         logger.info("Deleted key %s" % (key.constraint_name,))
-        self.get_model()
+                        changed = True
+        if changed:
+            self.get_model()
+            changed = False
 
         # create and/or upgrade fkeys, stripping acl-bindings which may be incoherent
         for nschema in self.doc_model_root.schemas.values():
@@ -493,9 +681,8 @@ class CfdeDataPackage (object):
             logger.info("Added foreign-keys %r" % ([ tuple(fkdoc["names"][0]) for fkdoc in need_parts ]))
             need_parts.clear()
 
-        self.get_model()
-
         # restore acl-bindings we stripped earlier
+        # (this refreshes our copy of the catalog model first)
         self.apply_custom_config()
         logger.info('Provisioned model in catalog %s' % self.catalog.get_server_uri())
 
@@ -706,14 +893,16 @@ class CfdeDataPackage (object):
         """Load tabular data from files into catalog table.
 
         :param onconflict: ERMrest onconflict query parameter to emulate (default abort)
+
+        Tables are loaded level by level in foreign key dependency
+        order, with the tables of one level sent concurrently by
+        worker threads. Set CFDE_UPLOAD_WORKERS=1 to load one table at
+        a time.
         """
         tables_doc = self.model_doc['schemas']['CFDE']['tables']
-        for table in tables_topo_sorted(self.doc_cfde_schema.tables.values()):
-            # we are doing a clean load of data in fkey dependency order
+        def load_table(table):
             resource = tables_doc[table.name]["annotations"].get(self.resource_tag, {})
             logger.debug('Loading table "%s"...' % table.name)
-            if "path" not in resource:
-                continue
             def open_package():
                 if isinstance(self.package_filename, PackageDataName):
                     path = resource["path"]
@@ -729,7 +918,8 @@ class CfdeDataPackage (object):
                     return self.package_filename.get_data_stringio(path)
                 else:
                     fname = "%s/%s" % (os.path.dirname(self.package_filename), resource["path"])
-                    return open(fname, 'r')
+                    # large buffer lets csv consume big sequential reads instead of 8 KiB ones
+                    return open(fname, 'r', encoding='utf-8', newline='', buffering=self.read_buffer_size)
             try:
                 with open_package() as f:
                     # translate TSV to python dicts
@@ -739,6 +929,12 @@ class CfdeDataPackage (object):
                     for cname in header:
                         if cname not in table.column_definitions.elements:
                             raise ValueError("header column %s not found in table %s" % (cname, table.name))
+                    # resolve column types once per table rather than per row
+                    json_cnames = [
+                        cname
+                        for cname in header
+                        if table.columns[cname].type.typename in ('text[]', 'json', 'jsonb', 'int4[]', 'int8[]')
+                    ]
                     if onconflict == 'update':
                         def has_key(cols):
                             if set(cols).issubset(set(header)):
@@ -768,11 +964,10 @@ class CfdeDataPackage (object):
                     batch = []
                     def store_batch():
                         def row_to_json(row):
-                            row = [ None if v in missing else v for v in row ]
-                            res = dict(zip(header, row))
-                            for cname in header:
-                                if table.columns[cname].type.typename in ('text[]', 'json', 'jsonb', 'int4[]', 'int8[]'):
-                                    res[cname] = json.loads(res[cname]) if res[cname] is not None else None
+                            res = dict(zip(header, [ None if v in missing else v for v in row ]))
+                            for cname in json_cnames:
+                                if res[cname] is not None:
+                                    res[cname] = json_loads(res[cname])
                             return res
                         payload = [ row_to_json(row) for row in batch ]
                         if onconflict == 'update':
@@ -821,13 +1016,113 @@ class CfdeDataPackage (object):
             except UnicodeDecodeError as e:
                 raise InvalidDatapackage('Resource file "%s" is not valid UTF-8 data: %s' % (resource["path"], e))
 
-    def sqlite_import_data_files(self, conn, onconflict='abort', table_error_callback=None, progress=None):
+        tables = [
+            table
+            for table in self.doc_cfde_schema.tables.values()
+            if "path" in tables_doc[table.name]["annotations"].get(self.resource_tag, {})
+        ]
+        max_workers = int(os.getenv('CFDE_UPLOAD_WORKERS', '4'))
+        if max_workers <= 1:
+            # we are doing a clean load of data in fkey dependency order
+            for table in tables_topo_sorted(tables):
+                load_table(table)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for level in tables_topo_levels(tables):
+                # finish each level before starting tables which reference it
+                for future in [ pool.submit(load_table, table) for table in level ]:
+                    future.result()
+
+    # TSV content where pyarrow and csv.reader would disagree: a field
+    # starting with a quote (after any skipped spaces), or a blank line
+    _tsv_arrow_unsafe_re = re.compile(rb'(?:\A|[\t\r\n]) *"|\n\n|\n\r|\r\r')
+
+    @classmethod
+    def tsv_arrow_compatible(cls, data):
+        """Return True if tsv_arrow_batches() parses data exactly like csv.reader.
+
+        :param data: The whole TSV content as a bytes-like object.
+
+        Without quoted fields or blank lines, the csv.reader(delimiter="\\t",
+        skipinitialspace=True) dialect reduces to splitting lines on
+        tabs and stripping leading spaces, which pyarrow can do.
+        """
+        return cls._tsv_arrow_unsafe_re.search(data) is None
+
+    @classmethod
+    def tsv_file_arrow_compatible(cls, fname):
+        """Return True if tsv_arrow_compatible() holds for the content of file fname."""
+        with open(fname, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return True
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return cls.tsv_arrow_compatible(data)
+
+    def tsv_arrow_batches(self, source, header, rpath):
+        """Yield lists of row tuples parsed from TSV source using pyarrow.
+
+        :param source: The TSV filename or pyarrow-readable binary stream to read.
+        :param header: The column names already read from the first line of source.
+        :param rpath: The resource path to use in error messages.
+
+        Only emulates csv.reader(delimiter="\\t", skipinitialspace=True)
+        for content accepted by tsv_arrow_compatible(): every column is
+        read as an unquoted string and leading spaces are stripped.
+        """
+        try:
+            reader = pyarrow.csv.open_csv(
+                source,
+                read_options=pyarrow.csv.ReadOptions(
+                    column_names=header,
+                    skip_rows=1,
+                    block_size=self.read_buffer_size,
+                ),
+                parse_options=pyarrow.csv.ParseOptions(
+                    delimiter='\t',
+                    # compatible content has no quoted fields, so any quote is literal
+                    quote_char=False,
+                    ignore_empty_lines=False,
+                ),
+                convert_options=pyarrow.csv.ConvertOptions(
+                    column_types={ cname: pyarrow.string() for cname in header },
+                    strings_can_be_null=False,
+                ),
+            )
+            for record_batch in reader:
+                columns = [
+                    pyarrow.compute.utf8_ltrim(column, characters=' ').to_pylist()
+                    for column in record_batch.columns
+                ]
+                yield list(zip(*columns))
+        except pyarrow.ArrowInvalid as e:
+            msg = str(e)
+            if msg.find('invalid UTF8') >= 0:
+                # let caller report this like a csv module decoding error
+                raise UnicodeDecodeError('utf-8', b'', 0, 0, msg)
+            raise InvalidDatapackage('Resource file "%s" inconsistent field counts: %s' % (rpath, msg))
+
+    # parsers matching frictionless integer and number field types
+    tsv_type_parsers = {
+        'int4': int,
+        'int8': int,
+        'float8': decimal.Decimal,
+    }
+
+    def sqlite_import_data_files(self, conn, onconflict='abort', table_error_callback=None, progress=None, schema=None, tablenames=None, check_types=False):
         """Load tabular data from files into sqlite table.
 
         :param conn: Existing sqlite3 connection to use as data destination.
         :param onconflict: ERMrest onconflict query parameter to emulate (default abort)
         :param table_error_callback: Optional callback to signal table loading errors, lambda rname, rpath, msg: ...
         :param progress: Optional, mutable progress/restart-marker dictionary
+        :param schema: Optional attached database name to qualify destination tables
+        :param tablenames: Optional set of tablenames to load (default None means load all tables)
+        :param check_types: Whether to check numeric field values like frictionless would (default False)
+
+        The check_types option stands in for frictionless field type
+        validation when that has been skipped. Values are checked as
+        TSV text, before sqlite column affinity can coerce them.
         """
         if progress is None:
             progress = dict()
@@ -837,16 +1132,24 @@ class CfdeDataPackage (object):
             resource = tables_doc[table.name]["annotations"].get(self.resource_tag, {})
             if "path" not in resource:
                 continue
+            if tablenames is not None and table.name not in tablenames:
+                continue
             if progress.get(table.name):
                 logger.info("Skipping sqlite import for %s due to existing progress marker" % table.name)
                 continue
             logger.debug('Importing table "%s" into sqlite...' % table.name)
+            if isinstance(self.package_filename, PackageDataName):
+                fname = None
+                # read (and decompress) bundled resources once for the header and row parsers
+                data = self.package_filename.get_data(resource["path"])
+            else:
+                fname = "%s/%s" % (os.path.dirname(self.package_filename), resource["path"])
             def open_package():
-                if isinstance(self.package_filename, PackageDataName):
-                    return self.package_filename.get_data_stringio(resource["path"])
+                if fname is None:
+                    return io.StringIO(data.decode())
                 else:
-                    fname = "%s/%s" % (os.path.dirname(self.package_filename), resource["path"])
-                    return open(fname, 'r')
+                    # large buffer lets csv consume big sequential reads instead of 8 KiB ones
+                    return open(fname, 'r', encoding='utf-8', newline='', buffering=self.read_buffer_size)
             try:
                 with open_package() as f:
                     # translate TSV to python dicts
@@ -860,8 +1163,30 @@ class CfdeDataPackage (object):
                         if cname not in table.column_definitions.elements:
                             raise InvalidDatapackage("header column %s not found in table %s" % (cname, table.name))
                     # Largest known CFDE ingest has file with >5m rows
-                    batch = []
-                    def insert_batch():
+                    # one prepared statement is reused for every row of this table
+                    # and missingValues are mapped to NULL by sqlite rather than per-value python code
+                    if len(missing) == 1:
+                        # the common case, e.g. missingValues [""], as one cheap builtin call
+                        missing_value = sql_literal(list(missing)[0])
+                        params = [
+                            'NULLIF(?%d, %s)' % (i, missing_value)
+                            for i in range(1, num_cols + 1)
+                        ]
+                    elif missing:
+                        missing_list = ', '.join([ sql_literal(x) for x in sorted(missing) ])
+                        params = [
+                            'CASE WHEN ?%d IN (%s) THEN NULL ELSE ?%d END' % (i, missing_list, i)
+                            for i in range(1, num_cols + 1)
+                        ]
+                    else:
+                        params = [ '?%d' % i for i in range(1, num_cols + 1) ]
+                    sql = "INSERT INTO %(table)s (%(cols)s) VALUES (%(params)s) %(upsert)s" % {
+                        'table': sql_qualified(schema, table.name),
+                        'cols': ', '.join([ sql_identifier(c) for c in header ]),
+                        'params': ', '.join(params),
+                        'upsert': 'ON CONFLICT DO NOTHING' if onconflict == 'skip' else '',
+                    }
+                    def check_field_counts():
                         for row in batch:
                             if len(row) != num_cols:
                                 msg = 'Expecting %d columns %r, found row with %d values %r.' % (
@@ -875,18 +1200,13 @@ class CfdeDataPackage (object):
                                     msg,
                                 ))
 
-                        sql = "INSERT INTO %(table)s (%(cols)s) VALUES %(values)s %(upsert)s" % {
-                            'table': sql_identifier(table.name),
-                            'cols': ', '.join([ sql_identifier(c) for c in header ]),
-                            'values': ', '.join([
-                                '(%s)' % (', '.join([ 'NULL' if x in missing else sql_literal(x) for x in row ]))
-                                for row in batch
-                            ]),
-                            'upsert': 'ON CONFLICT DO NOTHING' if onconflict == 'skip' else '',
-                        }
-
+                    def insert_batch():
                         try:
-                            conn.execute(sql)
+                            # sqlite rejects rows with the wrong number of bindings for us
+                            conn.executemany(sql, batch)
+                        except sqlite3.ProgrammingError:
+                            check_field_counts()
+                            raise
                         except sqlite3.OperationalError as e:
                             logger.info('got error during batch insertion: %s' % e)
                             logger.info('>>>>>>>>> BEGIN batch SQL')
@@ -933,7 +1253,7 @@ class CfdeDataPackage (object):
                                             ))
                                         keys.add(key)
                                         cur.execute("SELECT %(cols)s FROM %(table)s WHERE %(where)s" % {
-                                            'table': sql_identifier(table.name),
+                                            'table': sql_qualified(schema, table.name),
                                             'cols': ','.join([ sql_identifier(cname) for cname in error_cnames ]),
                                             'where': ' AND '.join([
                                                 '(%s = %s)' % (sql_identifier(k), sql_literal(v))
@@ -955,22 +1275,47 @@ class CfdeDataPackage (object):
                             raise
                         logger.debug("Batch of rows for %s loaded" % table.name)
 
-                    for raw_row in reader:
-                        # Collect full batch, then insert at once
-                        batch.append(raw_row)
-                        if len(batch) >= self.batch_size:
-                            try:
-                                insert_batch()
-                            except Exception as e:
-                                logger.error("Table %s data load FAILED from "
-                                             "%s: %s" % (table.name, self.package_filename, e))
-                                raise
-                            else:
-                                batch.clear()
-                    # After reader exhausted, ingest final batch
-                    if len(batch) > 0:
+                    if pyarrow is not None and (
+                            self.tsv_arrow_compatible(data) if fname is None else self.tsv_file_arrow_compatible(fname)
+                    ):
+                        # arrow parses blocks of the file in native code instead of the csv module
+                        if fname is None:
+                            # bundled resources, e.g. large vocabularies, are parsed from their (decompressed) buffer
+                            source = pyarrow.BufferReader(data)
+                        else:
+                            source = fname
+                        batches = self.tsv_arrow_batches(source, header, resource["path"])
+                    else:
+                        # quoted fields or blank lines need the exact csv module dialect
+                        # Collect full batch in one C-level slice, then insert at once
+                        batches = iter(lambda: list(itertools.islice(reader, self.sqlite_batch_size)), [])
+                    type_checks = [
+                        (pos, cname, self.tsv_type_parsers[table.column_definitions[cname].type.typename])
+                        for pos, cname in enumerate(header)
+                        if table.column_definitions[cname].type.typename in self.tsv_type_parsers
+                    ] if check_types else []
+
+                    def check_batch_types():
+                        for pos, cname, parse in type_checks:
+                            for row in batch:
+                                value = row[pos]
+                                if value in missing:
+                                    continue
+                                try:
+                                    parse(value)
+                                except (ValueError, ArithmeticError):
+                                    raise InvalidDatapackage('Resource file "%s" has invalid %s value %r for column %r' % (
+                                        resource["path"],
+                                        table.column_definitions[cname].type.typename,
+                                        value,
+                                        cname,
+                                    ))
+
+                    for batch in batches:
                         try:
                             insert_batch()
+                            # field counts were enforced by the insert
+                            check_batch_types()
                         except Exception as e:
                             logger.error("Table %s data load FAILED from "
                                          "%s: %s" % (table.name, self.package_filename, e))
@@ -981,6 +1326,116 @@ class CfdeDataPackage (object):
                 if table_error_callback:
                     table_error_callback(resource["name"], resource["path"], str(e))
                 raise InvalidDatapackage('Resource file "%s" is not valid UTF-8 data: %s' % (resource["path"], e))
+            except InvalidDatapackage as e:
+                # e.g. field count errors found while parsing, with either csv or pyarrow
+                if table_error_callback:
+                    table_error_callback(resource["name"], resource["path"], str(e))
+                raise
+
+    def sqlite_import_data_files_parallel(self, sqlite_filename, onconflict='abort', table_error_callback=None, progress=None, max_workers=4, check_types=False):
+        """Load tabular data from files into sqlite tables using a process pool.
+
+        :param sqlite_filename: The sqlite database file to use as data destination.
+        :param onconflict: ERMrest onconflict query parameter to emulate (default abort)
+        :param table_error_callback: Optional callback to signal table loading errors, lambda rname, rpath, msg: ...
+        :param progress: Optional, mutable progress/restart-marker dictionary
+        :param max_workers: Number of worker processes (default 4)
+        :param check_types: Whether to check numeric field values like frictionless would (default False)
+
+        Each table is parsed and loaded by a worker process into its
+        own scratch sqlite file, so TSV parsing runs on multiple cores.
+        The parent then merges each scratch table into the destination
+        in fkey dependency order.
+
+        Only supported for datapackages named by filesystem path.
+        """
+        if progress is None:
+            progress = dict()
+        if isinstance(self.package_filename, PackageDataName):
+            raise TypeError('Parallel import requires a datapackage filename, not %r' % (self.package_filename,))
+
+        tables_doc = self.model_doc['schemas']['CFDE']['tables']
+        tables = [
+            table
+            for table in tables_topo_sorted(self.doc_cfde_schema.tables.values())
+            if "path" in tables_doc[table.name]["annotations"].get(self.resource_tag, {})
+            and not progress.get(table.name)
+        ]
+        if not tables:
+            return
+
+        scratch_dir = tempfile.mkdtemp(
+            suffix='.loading',
+            prefix=os.path.basename(sqlite_filename) + '_',
+            dir=os.path.dirname(sqlite_filename) or None,
+        )
+        def scratch_filename(table):
+            return '%s/%s.sqlite3' % (scratch_dir, table.name)
+
+        try:
+            # spawn rather than fork, since callers may have other threads holding locks
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {
+                    table.name: pool.submit(
+                        _sqlite_import_table_worker,
+                        self.package_filename,
+                        table.name,
+                        scratch_filename(table),
+                        onconflict,
+                        check_types,
+                    )
+                    for table in tables
+                }
+                conn = sqlite3.connect(sqlite_filename)
+                try:
+                    sqlite_tune_bulk(conn)
+                    for table in tables:
+                        errors, exc = futures[table.name].result()
+                        if table_error_callback:
+                            for rname, rpath, msg in errors:
+                                table_error_callback(rname, rpath, msg)
+                        if exc is not None:
+                            for future in futures.values():
+                                future.cancel()
+                            raise exc
+                        try:
+                            self._sqlite_merge_table(conn, table, scratch_filename(table), onconflict)
+                        except InvalidDatapackage as e:
+                            # e.g. key conflicts with content merged from earlier tables
+                            if table_error_callback:
+                                resource = tables_doc[table.name]["annotations"][self.resource_tag]
+                                table_error_callback(resource["name"], resource["path"], str(e))
+                            raise
+                        progress[table.name] = True
+                        logger.info("All data for table %s loaded from %s." % (table.name, self.package_filename))
+                finally:
+                    conn.close()
+        finally:
+            shutil.rmtree(scratch_dir)
+
+    def _sqlite_merge_table(self, conn, table, scratch_filename, onconflict):
+        """Copy one table's content from a scratch sqlite file into conn's main database."""
+        cols = ', '.join([
+            sql_identifier(col.name)
+            for col in table.column_definitions
+            if col.name not in {'nid', 'RID', 'RCT', 'RCB', 'RMT', 'RMB'}
+        ])
+        conn.execute('ATTACH DATABASE %s AS "scratch";' % (sql_literal(scratch_filename),))
+        try:
+            conn.execute('BEGIN IMMEDIATE;')
+            try:
+                # WHERE true disambiguates the upsert clause following SELECT
+                conn.execute('INSERT INTO main.%(tname)s (%(cols)s) SELECT %(cols)s FROM "scratch".%(tname)s WHERE true %(upsert)s' % {
+                    'tname': sql_identifier(table.name),
+                    'cols': cols,
+                    'upsert': 'ON CONFLICT DO NOTHING' if onconflict == 'skip' else '',
+                })
+            except sqlite3.IntegrityError as e:
+                conn.rollback()
+                raise InvalidDatapackage('Resource for table "%s" conflicts with existing content: %s' % (table.name, e))
+            conn.commit()
+        finally:
+            conn.execute('DETACH DATABASE "scratch";')
 
     def check_sqlite_tables(self, conn, source=None, table_error_callback=None, tablenames=None, progress=None):
         """Validate tabular data from sqlite table according to model.
@@ -1141,6 +1596,7 @@ LIMIT 1;
         if tables is None:
             tables = self.doc_cfde_schema.tables.values()
         cur = conn.cursor()
+        cur.arraysize = self.batch_size
         for table in tables_topo_sorted(tables):
             # we are loading a catalog table from a sqlite table with the same table name
             cur.execute("SELECT true FROM sqlite_master WHERE type = 'table' AND name = %s" % (sql_literal(table.name),))
@@ -1177,7 +1633,7 @@ LIMIT 1;
             )
             valfuncs = [
                 # f(x) does json decoding or is identify func, depending on column def
-                (lambda x: json.loads(x) if x is not None else x) if col.type.typename in ('text[]', 'json', 'jsonb', 'int4[]', 'int8[]') else lambda x: x
+                (lambda x: json_loads(x) if x is not None else x) if col.type.typename in ('text[]', 'json', 'jsonb', 'int4[]', 'int8[]') else lambda x: x
                 for col in cols
             ]
             position = progress.get(table.name, None)
@@ -1221,7 +1677,7 @@ LIMIT 1;
                     'batchsize': '%d' % self.batch_size,
                 }
                 cur.execute(sql)
-                batch = list(cur)
+                batch = cur.fetchmany()
                 if batch:
                     batch = batch_trim(batch)
                     position = batch[-1][0]
@@ -1263,15 +1719,16 @@ LIMIT 1;
                         batch = get_existing_batch()
                     logger.debug("Retrieved local copy of existing table %s with %d rows" % (table.name, len(existing)))
 
-                nrows = 0
-                for batch in get_batches(cur):
-                    marker = batch[-1][0]
-                    orig_batch = [
-                        # generate per-row dict { colname: f(x), ... } with transcoded row values
-                        dict(zip( colnames, [ f(x) for f, x in zip (valfuncs, row[1:]) ]))
-                        for row in batch
-                    ]
+                def needs_update(row):
+                    erow = existing.get(row['id'])
+                    if erow is None:
+                        return False
+                    for cname in colnames:
+                        if row[cname] != erow[cname]:
+                            return True
+                    return False
 
+                def send_batch(orig_batch):
                     if onconflict == 'update':
                         # only need to POST rows that don't exist
                         batch = [ row for row in orig_batch if row['id'] not in existing ]
@@ -1284,23 +1741,41 @@ LIMIT 1;
                         logger.debug("POST /entity/ sent for %d new rows" % blen)
 
                     if onconflict == 'update':
-                        def needs_update(row):
-                            erow = existing.get(row['id'])
-                            if erow is None:
-                                return False
-                            for cname in colnames:
-                                if row[cname] != erow[cname]:
-                                    return True
-                            return False
                         # only update rows that show differences
                         batch = [ row for row in orig_batch if needs_update(row) ]
                         if batch:
                             r = self.catalog.put(update_url, json=batch).json()
                             logger.debug("PUT /attributegroup/ sent for %d existing rows" % len(batch))
 
-                    progress[table.name] = marker
-                    nrows += blen
-                    logger.info("Batch of %d rows loaded for %s (%d cumulative)" % (blen, table.name, nrows))
+                    return blen
+
+                nrows = 0
+                # overlap sqlite reads and transcoding of the next batch with the
+                # network round-trip of the previous one, keeping one request in flight
+                # so batches are still sent and restart-marked in "nid" order
+                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as sender:
+                    pending = None
+                    def finish_pending():
+                        nonlocal nrows
+                        future, marker = pending
+                        blen = future.result()
+                        progress[table.name] = marker
+                        nrows += blen
+                        logger.info("Batch of %d rows loaded for %s (%d cumulative)" % (blen, table.name, nrows))
+
+                    for batch in get_batches(cur):
+                        marker = batch[-1][0]
+                        orig_batch = [
+                            # generate per-row dict { colname: f(x), ... } with transcoded row values
+                            dict(zip( colnames, [ f(x) for f, x in zip (valfuncs, row[1:]) ]))
+                            for row in batch
+                        ]
+                        if pending is not None:
+                            finish_pending()
+                        pending = (sender.submit(send_batch, orig_batch), marker)
+
+                    if pending is not None:
+                        finish_pending()
 
                 logger.info("Table %s loaded %s rows." % (table.name, nrows,))
                 if table_done_callback:
@@ -1638,10 +2113,9 @@ FROM %(srcschema)s.%(tname)s src
                     logger.info('Skipping table-generating ETL for %s due to restart marker' % resource['name'])
                     continue
                 sql = self.generate_resource_etl_sql(source_dp, source_sql_schema, resource)
-                conn.execute('DELETE FROM %s' % sql_identifier(resource['name']),)
                 logger.debug('Running table-generating ETL for %s...' % sql_identifier(resource['name']))
                 try:
-                    conn.executescript(sql)
+                    self._sqlite_etl_step(conn, 'DELETE FROM %s' % sql_identifier(resource['name']), sql)
                 except Exception as e:
                     logger.error('Failed to run table-generating ETL for %s: %s' % (sql_identifier(resource['name']), e))
                     raise
@@ -1659,33 +2133,75 @@ FROM %(srcschema)s.%(tname)s src
                         logger.info('Skipping column-generating ETL for %s.%s due to restart marker' % (resource['name'], column['name']))
                         continue
                     sql = self.package_filename.get_data_str(column['derivation_sql_path'])
-                    conn.execute('UPDATE %s SET %s = NULL' % (sql_identifier(resource['name']), sql_identifier(column['name'])))
                     logger.debug('Running column-generating ETL for %s.%s...' % (sql_identifier(resource['name']), sql_identifier(column['name'])))
                     try:
-                        conn.executescript(sql)
+                        self._sqlite_etl_step(
+                            conn,
+                            'UPDATE %s SET %s = NULL' % (sql_identifier(resource['name']), sql_identifier(column['name'])),
+                            sql
+                        )
                     except Exception as e:
                         logger.error('Failed to run column-generating ETL for %s.%s: %s' % (resource['name'], sql_identifier(column['name']), e))
                         raise
                     progress["columns"][resource["name"]][column["name"]] = True
                     logger.info('ETL complete for %s.%s' % (sql_identifier(resource['name']), sql_identifier(column['name'])))
 
-    def provision_sqlite(self, conn):
+    def _sqlite_etl_step(self, conn, clear_sql, etl_sql):
+        """Run one ETL step's clear and recompute SQL as a single transaction.
+
+        The derived content is computed entirely by the embedded SQL,
+        so one commit per step avoids per-statement commits inside
+        the script. The restart marker is recorded separately, after
+        this commit, so the step is idempotent rather than atomic with
+        it: a step whose marker was lost just clears and recomputes
+        its content when re-run.
+        """
+        if conn.in_transaction:
+            conn.commit()
+        try:
+            conn.executescript('BEGIN;\n%s;\n%s\n;\nCOMMIT;' % (clear_sql, etl_sql))
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+    def provision_sqlite(self, conn, schema=None, indexes=True):
         """Provision this datapackage schema into provided SQLite db
 
         :param conn: Connection to an already opened SQLite db.
+        :param schema: Optional attached database name to provision instead of main.
+        :param indexes: Create fkey indexes with tables (default True).
 
         Trivial idempotence... use CREATE TABLE IF NOT EXISTS
 
         Caller should manage transactions if desired.
+
+        With indexes=False, caller should run provision_sqlite_indexes()
+        after bulk loading, which is faster than maintaining the
+        indexes row by row.
         """
         for table in tables_topo_sorted(self.doc_cfde_schema.tables.values()):
-            for sql in self.table_sqlite_ddl(self.doc_cfde_schema.tables[table.name]):
+            for sql in self.table_sqlite_ddl(self.doc_cfde_schema.tables[table.name], schema, indexes):
                 conn.execute(sql)
 
-    def table_sqlite_ddl(self, table):
+    def provision_sqlite_indexes(self, conn, schema=None):
+        """Idempotently provision fkey indexes for this datapackage schema into provided SQLite db
+
+        :param conn: Connection to an already opened SQLite db.
+        :param schema: Optional attached database name to provision instead of main.
+
+        Caller should manage transactions if desired.
+        """
+        for table in self.doc_cfde_schema.tables.values():
+            for sql in self.table_sqlite_index_ddl(table, schema):
+                conn.execute(sql)
+
+    def table_sqlite_ddl(self, table, schema=None, indexes=True):
         """Yield SQLite DDL for table
 
         May yield multiple statements, each of which must be executed in order.
+        Optional schema qualifies created tables and indexes.
+        Optional indexes=False omits the fkey indexes.
         """
         parts = [
             self.column_sqlite_ddl(col)
@@ -1710,14 +2226,22 @@ CREATE TABLE IF NOT EXISTS %(tname)s (
   %(list)s
 );
 """ % {
-    'tname': sql_identifier(table.name),
+    'tname': sql_qualified(schema, table.name),
     'list': ',\n'.join(parts),
 })
+        if indexes:
+            yield from self.table_sqlite_index_ddl(table, schema)
+
+    def table_sqlite_index_ddl(self, table, schema=None):
+        """Yield SQLite DDL for indexes covering table's fkeys
+
+        Optional schema qualifies created indexes.
+        """
         for fkey in table.foreign_keys:
             # drop cross-schema fkeys and those using system columns
             if fkey.pk_table.schema is table.schema \
                and all([ col.name not in {'RCT', 'RCB', 'RMT', 'RMB'} for col in fkey.foreign_key_columns ]):
-                yield self.fkey_index_sqlite_ddl(fkey)
+                yield self.fkey_index_sqlite_ddl(fkey, schema)
 
     def column_sqlite_ddl(self, col):
         """Output SQLite DDL for column (as part of CREATE TABLE statement)"""
@@ -1767,7 +2291,7 @@ CREATE TABLE IF NOT EXISTS %(tname)s (
             'tocols': ', '.join([ sql_identifier(e[1].name) for e in items ]),
         }
 
-    def fkey_index_sqlite_ddl(self, fkey):
+    def fkey_index_sqlite_ddl(self, fkey, schema=None):
         """Output SQLite DDL for index covering fkey columns (to complement CREATE TABLE statement)"""
         # figure out canonical ordering to match key constraint
         key = fkey.pk_table.key_by_columns(fkey.referenced_columns)
@@ -1781,7 +2305,41 @@ CREATE TABLE IF NOT EXISTS %(tname)s (
         fkcol_ranks.sort(key=lambda e: (e[1], e[0].name))
         cols = [ col for col, rank in fkcol_ranks ]
         return "CREATE INDEX IF NOT EXISTS %(idxname)s ON %(tname)s (%(cols)s);" % {
-            'idxname': sql_identifier('%s_idx' % fkey.name[1]),
+            'idxname': sql_qualified(schema, '%s_idx' % fkey.name[1]),
             'tname': sql_identifier(fkey.table.name),
             'cols': ', '.join([ sql_identifier(c.name) for c in cols ]),
         }
+
+def _sqlite_import_table_worker(package_filename, tname, scratch_filename, onconflict, check_types=False):
+    """Load one datapackage table into a private scratch sqlite file.
+
+    Runs in a worker process for sqlite_import_data_files_parallel(),
+    returning (errors, exc) where errors is a list of table error
+    callback arguments and exc is an InvalidDatapackage or None.
+    """
+    errors = []
+    # pool workers handle many tables, so build the model only once per worker
+    dp = CfdeDataPackage.from_file_cached(package_filename)
+    conn = sqlite3.connect(scratch_filename)
+    try:
+        # scratch content is disposable, so skip journaling entirely
+        with conn:
+            conn.execute('PRAGMA journal_mode=OFF;')
+            conn.execute('PRAGMA synchronous=OFF;')
+            conn.execute('BEGIN;')
+            # scratch tables are only read back in full, so they need no indexes
+            for sql in dp.table_sqlite_ddl(dp.doc_cfde_schema.tables[tname], indexes=False):
+                conn.execute(sql)
+            dp.sqlite_import_data_files(
+                conn,
+                onconflict=onconflict,
+                table_error_callback=lambda rname, rpath, msg: errors.append((rname, rpath, msg)),
+                tablenames={tname},
+                check_types=check_types,
+            )
+        return errors, None
+    except InvalidDatapackage as e:
+        return errors, e
+    finally:
+        # release the scratch file before the parent attaches it
+        conn.close()
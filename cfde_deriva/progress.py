@@ -0,0 +1,127 @@
+
+import logging
+import sqlite3
+from collections.abc import Mapping, MutableMapping
+
+from .datapackage import json_loads, json_dumps
+
+logger = logging.getLogger(__name__)
+
+class SqliteProgress (MutableMapping):
+    """Dict-like progress/restart-marker store backed by a sqlite table.
+
+    Entries are stored as rows of a progress table keyed by (phase,
+    dcc_id, key) with a JSON value, so each marker update touches
+    only one row instead of re-serializing the whole progress state.
+
+    Nested mappings are supported to match the shape of progress
+    dicts consumed by CfdeDataPackage methods. Assigning a mapping
+    value stores a marker row and places the nested entries under a
+    derived phase "parent/key" in the same dcc_id scope.
+
+    """
+    def __init__(self, conn, phase, dcc_id=''):
+        """Bind a progress scope.
+
+        :param conn: A sqlite3 connection as returned by SqliteProgress.connect().
+        :param phase: The processing phase name scoping these markers.
+        :param dcc_id: Optional scope within phase, e.g. a datapackage id (default '').
+        """
+        self.conn = conn
+        self.phase = phase
+        self.dcc_id = dcc_id
+
+    @classmethod
+    def connect(cls, sqlite_filename):
+        """Open (and idempotently provision) a progress database.
+
+        The connection is in autocommit mode, so each marker update is
+        durable as soon as it is stored. It may be shared by worker
+        threads which each update their own markers.
+        """
+        conn = sqlite3.connect(sqlite_filename, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.execute('PRAGMA synchronous=NORMAL;')
+        conn.execute("""
+CREATE TABLE IF NOT EXISTS progress (
+  phase text NOT NULL,
+  dcc_id text NOT NULL,
+  "key" text NOT NULL,
+  "value" text,
+  PRIMARY KEY (phase, dcc_id, "key")
+);
+""")
+        logger.debug('Opened progress database %s' % (sqlite_filename,))
+        return conn
+
+    def _child(self, key):
+        return type(self)(self.conn, '%s/%s' % (self.phase, key), self.dcc_id)
+
+    def to_dict(self):
+        """Return a plain, deep copy of this progress scope."""
+        return {
+            k: v.to_dict() if isinstance(v, SqliteProgress) else v
+            for k, v in self.items()
+        }
+
+    def __getitem__(self, key):
+        row = self.conn.execute(
+            'SELECT "value" FROM progress WHERE phase = ? AND dcc_id = ? AND "key" = ?',
+            (self.phase, self.dcc_id, key)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = json_loads(row[0])
+        if isinstance(value, dict):
+            return self._child(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if isinstance(value, Mapping):
+            if isinstance(value, SqliteProgress):
+                value = value.to_dict()
+            child = self._child(key)
+            child.clear()
+            child.update(value)
+            value = {}
+        self.conn.execute(
+            'INSERT OR REPLACE INTO progress (phase, dcc_id, "key", "value") VALUES (?, ?, ?, ?)',
+            (self.phase, self.dcc_id, key, json_dumps(value))
+        )
+
+    def __delitem__(self, key):
+        if isinstance(self[key], SqliteProgress):
+            self._child(key).clear()
+        self.conn.execute(
+            'DELETE FROM progress WHERE phase = ? AND dcc_id = ? AND "key" = ?',
+            (self.phase, self.dcc_id, key)
+        )
+
+    def __iter__(self):
+        cur = self.conn.execute(
+            'SELECT "key" FROM progress WHERE phase = ? AND dcc_id = ? ORDER BY "key"',
+            (self.phase, self.dcc_id)
+        )
+        return iter([ row[0] for row in cur.fetchall() ])
+
+    def __len__(self):
+        return self.conn.execute(
+            'SELECT count(*) FROM progress WHERE phase = ? AND dcc_id = ?',
+            (self.phase, self.dcc_id)
+        ).fetchone()[0]
+
+    def clear(self):
+        """Remove all entries in this scope, including nested scopes."""
+        prefix = self.phase + '/'
+        self.conn.execute(
+            'DELETE FROM progress WHERE dcc_id = ? AND (phase = ? OR substr(phase, 1, ?) = ?)',
+            (self.dcc_id, self.phase, len(prefix), prefix)
+        )
+
+    def setdefault(self, key, default=None):
+        """Like dict.setdefault() but returns the stored (possibly nested) value."""
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return self[key]
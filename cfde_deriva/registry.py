@@ -1,23 +1,28 @@
 
 import os
 import sys
+import re
 import datetime
+import functools
 import json
 import logging
 import urllib3
 import requests.exceptions
 
-from deriva.core import DerivaServer, ErmrestCatalog, get_credential, DEFAULT_SESSION_CONFIG, init_logging, urlquote
+from deriva.core import DerivaServer, ErmrestCatalog, get_credential, DEFAULT_SESSION_CONFIG, init_logging, urlquote, urlunquote
 from deriva.core.ermrest_model import nochange
 from deriva.core.datapath import ArrayD
 from deriva.core.utils.core_utils import AttrDict
 
 from . import exception
 from .tableschema import RegistryConfigurator, authn_id, terms
-from .datapackage import CfdeDataPackage, registry_schema_json, tag
+from .datapackage import CfdeDataPackage, registry_schema_json, tag, response_json
 
 logger = logging.getLogger(__name__)
 
+# like Submission.extract_catalog_id() but for catalog URLs on any server
+_catalog_url_re = re.compile(r'.*/ermrest/catalog/(?P<catalog>[^/]+)/?')
+
 ermrest_creators_acl = [
     authn_id.cfde_infrastructure_ops,
     authn_id.cfde_portal_admin,
@@ -137,6 +142,16 @@ class Registry (object):
         self._catalog = ErmrestCatalog(scheme, servername, catalog, credentials, session_config=session_config)
         self._builder = self._catalog.getPathBuilder()
 
+    @property
+    def has_release_catalog_id(self):
+        """True if this registry has the release.catalog_id column.
+
+        The column is provisioned from the registry model in
+        cfde-registry-model.json, so older registries lack it until
+        their model is upgraded. custom_migration() only backfills it.
+        """
+        return 'catalog_id' in self._builder.CFDE.release.column_definitions.keys()
+
     def validate_dcc_id(self, dcc_id, submitting_user):
         """Validate that user has submitter role with this DCC according to registry.
 
@@ -151,15 +166,26 @@ class Registry (object):
             raise exception.UnknownDccId(dcc_id)
         self.enforce_dcc_submission(dcc_id, submitting_user)
 
-    def _get_entity(self, table_name, id=None, sortby=None):
+    def _get_entity(self, table_name, id=None, sortby=None, statuses=None):
         """Get one or all entity records from a registry table.
 
         :param table_name: The registry table to access.
         :param id: A key to retrieve one row (default None retrieves all)
+        :param sortby: A column name or list of column names to sort results (default None)
+        :param statuses: An iterable of status values to restrict results (default None retrieves all)
         """
         path = self._builder.CFDE.tables[table_name].path
         if id is not None:
             path = path.filter(path.table_instances[table_name].column_definitions['id'] == id)
+        if statuses is not None:
+            statuses = list(statuses)
+            if not statuses:
+                return []
+            status = path.table_instances[table_name].column_definitions['status']
+            path = path.filter(functools.reduce(
+                lambda a, b: a | b,
+                [ status == s for s in statuses ]
+            ))
         results = path.entities()
         if sortby is not None:
             if isinstance(sortby, str):
@@ -167,6 +193,37 @@ class Registry (object):
             results = results.sort(*[ path.table_instances[table_name].column_definitions[cname] for cname in sortby ])
         return list( results.fetch() )
 
+    def _iter_entity(self, table_name, page_size=500, statuses=None):
+        """Iterate over all entity records from a registry table, fetched in pages.
+
+        :param table_name: The registry table to access.
+        :param page_size: The number of rows to fetch per request (default 500).
+        :param statuses: An iterable of status values to restrict results (default None retrieves all)
+
+        Rows are yielded in RID order, without holding the whole table in memory.
+        """
+        if statuses is not None:
+            statuses = list(statuses)
+            if not statuses:
+                return
+            # disjunctive filter evaluated by the server
+            status_filter = '/' + ';'.join([ 'status=%s' % urlquote(s) for s in sorted(statuses) ])
+        else:
+            status_filter = ''
+        after = ''
+        while True:
+            rows = response_json(self._catalog.get('/entity/CFDE:%s%s@sort(RID)%s?limit=%d' % (
+                urlquote(table_name),
+                status_filter,
+                after,
+                page_size,
+            )))
+            for row in rows:
+                yield row
+            if len(rows) < page_size:
+                return
+            after = '@after(%s)' % urlquote(rows[-1]['RID'])
+
     def get_user(self, client_id):
         """Get WebauthnUser instance representing existing registry user with client_id.
 
@@ -193,11 +250,23 @@ class Registry (object):
         """
         return self._get_entity('datapackage', sortby=None)
 
-    def list_releases(self, sortby=None):
+    def iter_datapackages(self, page_size=500, statuses=None):
+        """Iterate over all datapackage submissions in the registry, fetched in pages
+
+        :param page_size: The number of rows to fetch per request (default 500).
+        :param statuses: An iterable of datapackage.status values to restrict results (default None retrieves all)
+
+        """
+        return self._iter_entity('datapackage', page_size=page_size, statuses=statuses)
+
+    def list_releases(self, sortby=None, statuses=None):
         """Get a list of all release definitions in the registry
 
+        :param sortby: A column name or list of column names to sort results (default None)
+        :param statuses: An iterable of release.status values to restrict results (default None retrieves all)
+
         """
-        return self._get_entity('release', sortby=sortby)
+        return self._get_entity('release', sortby=sortby, statuses=statuses)
 
     def get_latest_approved_datapackages(self, need_dcc_appr=True, need_cfde_appr=True):
         """Get a map of latest datapackages approved for release for each DCC id."""
@@ -412,25 +481,47 @@ class Registry (object):
         :param table_name: The "name" field of the tabular resource
 
         """
-        newrow = {
-            'datapackage': datapackage,
-            'position': position,
-            'table_name': table_name,
-            'status': terms.cfde_registry_dpt_status.enumerated,
-            'num_rows': None,
-            'diagnostics': None,
-        }
+        self.register_datapackage_tables(datapackage, [table_name], first_position=position)
+
+    def register_datapackage_tables(self, datapackage, table_names, first_position=0):
+        """Idempotently register a list of new datapackage tables in registry.
+
+        :param datapackage: The datapackage.id for the containing datapackage
+        :param table_names: The list of "name" fields of tabular resources, in datapackage order
+        :param first_position: The integer position of the first table in the datapackage's list of resources (default 0)
+
+        Uses one request to register all tables, plus at most one
+        more to reset status on tables which were already registered.
+        """
+        newrows = [
+            {
+                'datapackage': datapackage,
+                'position': position,
+                'table_name': table_name,
+                'status': terms.cfde_registry_dpt_status.enumerated,
+                'num_rows': None,
+                'diagnostics': None,
+            }
+            for position, table_name in enumerate(table_names, start=first_position)
+        ]
+        if not newrows:
+            return
 
         rows = self._catalog.post(
             '/entity/CFDE:datapackage_table?onconflict=skip',
-            json=[newrow]
+            json=newrows
         ).json()
 
-        if len(rows) == 0:
-            # row exits
-            self.update_datapackage_table(datapackage, position, status=terms.cfde_registry_dpt_status.enumerated)
+        if len(rows) < len(newrows):
+            # some rows exist
+            inserted = { row['position'] for row in rows }
+            self.update_datapackage_tables(datapackage, {
+                row['position']: {'status': terms.cfde_registry_dpt_status.enumerated}
+                for row in newrows
+                if row['position'] not in inserted
+            })
 
-    def update_release(self, id, status=nochange, description=nochange, cfde_approval_status=nochange, release_time=nochange, ermrest_url=nochange, browse_url=nochange, summary_url=nochange, diagnostics=nochange):
+    def update_release(self, id, status=nochange, description=nochange, cfde_approval_status=nochange, release_time=nochange, ermrest_url=nochange, catalog_id=nochange, browse_url=nochange, summary_url=nochange, diagnostics=nochange):
         """Idempotently update release metadata in registry.
 
         :param id: The release.id of the existing record to update
@@ -439,6 +530,7 @@ class Registry (object):
         :param cfde_approval_status: The new release.cfde_approval_status value (default nochange)
         :param release_time: The new release.release_time value (default nochange)
         :param ermrest_url: The new release.review_ermrest_url value (default nochange)
+        :param catalog_id: The new release.catalog_id value (default nochange)
         :param browse_url: The new release.review_browse_url value (default nochange)
         :param summary_url: The new release.review_summary_url value (default nochange)
         :param diagnostics: The new release.diagnostics value (default nochange)
@@ -451,6 +543,9 @@ class Registry (object):
         """
         if not isinstance(id, str):
             raise TypeError('expected id of type str, not %s' % (type(id),))
+        if not self.has_release_catalog_id:
+            # registry not yet migrated, ermrest_url alone records the catalog
+            catalog_id = nochange
         existing, existing_dcc_dps = self.get_release(id)
         changes = {
             k: v
@@ -460,6 +555,7 @@ class Registry (object):
                     'cfde_approval_status': cfde_approval_status,
                     'release_time': release_time,
                     'ermrest_url': ermrest_url,
+                    'catalog_id': catalog_id,
                     'browse_url': browse_url,
                     'summary_url': summary_url,
                     'diagnostics': diagnostics,
@@ -522,31 +618,73 @@ class Registry (object):
         :Param diagnostics: The new datapackage_table.diagnostics value (default nochange)
 
         """
-        if not isinstance(datapackage, str):
-            raise TypeError('expected datapackage of type str, not %s' % (type(datapackage),))
         if not isinstance(position, int):
             raise TypeError('expected id of type int, not %s' % (type(position),))
-        existing = self.get_datapackage_table(datapackage, position)
-        changes = {
-            k: v
-            for k, v in {
-                    'status': status,
-                    'num_rows': num_rows,
-                    'diagnostics': diagnostics,
-            }.items()
-            if v is not nochange and v != existing[k]
-        }
-        if not changes:
-            return
-        changes.update({
-            'datapackage': datapackage,
-            'position': position,
+        self.update_datapackage_tables(datapackage, {
+            position: {
+                'status': status,
+                'num_rows': num_rows,
+                'diagnostics': diagnostics,
+            }
         })
+
+    def update_datapackage_tables(self, datapackage, updates):
+        """Idempotently update metadata for several datapackage_table rows in registry.
+
+        :param datapackage: The datapackage_table.datapackage key value
+        :param updates: A dict of {position: {column: value}} for status, num_rows, and diagnostics columns
+
+        Column values may be nochange or omitted to leave them as
+        is. Uses one request to fetch the existing rows at the given
+        positions and one request to update all changed rows.
+
+        Raises IndexError if a position is not found.
+        """
+        if not isinstance(datapackage, str):
+            raise TypeError('expected datapackage of type str, not %s' % (type(datapackage),))
+        if not updates:
+            return
+        path = self._builder.CFDE.datapackage_table.path
+        path = path.filter(path.datapackage_table.datapackage == datapackage)
+        # only fetch the rows being updated, e.g. one row for update_datapackage_table()
+        position_col = path.datapackage_table.position
+        path = path.filter(functools.reduce(
+            lambda a, b: a | b,
+            [ position_col == position for position in sorted(updates) ]
+        ))
+        existing_rows = { row['position']: row for row in path.entities().fetch() }
+
+        rows = []
+        for position, cols in updates.items():
+            existing = existing_rows.get(position)
+            if existing is None:
+                raise IndexError('Datapackage table ("%s", %d) not found in registry.' % (datapackage, position))
+            changes = {
+                k: v
+                for k, v in cols.items()
+                if k in {'status', 'num_rows', 'diagnostics'}
+                and v is not nochange and v != existing[k]
+            }
+            if not changes:
+                continue
+            changes.update({
+                'datapackage': datapackage,
+                'position': position,
+            })
+            rows.append((existing, changes))
+
+        if not rows:
+            return
+
+        # attributegroup updates need the same columns in every row,
+        # so pad each row's changes with its existing values
+        cnames = sorted({ k for existing, changes in rows for k in changes } - {'datapackage', 'position'})
         self._catalog.put(
-            '/attributegroup/CFDE:datapackage_table/datapackage,position;%s' % (
-                ','.join([ c for c in changes.keys() if c not in {'datapackage', 'position'} ]),
-            ),
-            json=[changes]
+            '/attributegroup/CFDE:datapackage_table/datapackage,position;%s' % (','.join(cnames),),
+            json=[
+                dict({ k: existing[k] for k in cnames }, **changes)
+                for existing, changes in rows
+            ]
         )
 
     def get_dcc(self, dcc_id=None):
@@ -699,6 +837,22 @@ class Registry (object):
                 '/entity/CFDE:approval_status/id=%s' % urlquote(approved_hold)
             )
 
+        # idempotently backfill release.catalog_id for releases registered before it existed
+        rows = self._catalog.get('/attribute/CFDE:release/catalog_id::null::/!ermrest_url::null::/id,ermrest_url').json()
+        backfill = []
+        for row in rows:
+            m = _catalog_url_re.fullmatch(row['ermrest_url'])
+            if m:
+                backfill.append({'id': row['id'], 'catalog_id': urlunquote(m.group('catalog'))})
+            else:
+                logger.warning('Skipping catalog_id backfill for release %s with unexpected ermrest_url %s' % (row['id'], row['ermrest_url']))
+        if backfill:
+            self._catalog.put(
+                '/attributegroup/CFDE:release/id;catalog_id',
+                json=backfill,
+            ).json()
+            logger.info('Backfilled catalog_id for %d releases' % (len(backfill),))
+
     def fixup_url_hostnames(self, fqdn):
         """Rewrite URLs in registry if we've moved the FQDN of the deployment"""
         rewrites = []
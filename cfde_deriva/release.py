@@ -1,22 +1,25 @@
 
 import os
 import sys
+import itertools
+import collections
 import uuid
 import logging
 import json
 import traceback
 import requests
 import datetime
-import dateutil.parser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from deriva.core import DerivaServer, get_credential, init_logging, urlquote, urlunquote
 
 from . import exception
 from .cfde_login import get_archive_headers_map
 from .tableschema import ReleaseConfigurator, authn_id
-from .datapackage import CfdeDataPackage, constituent_schema_json, portal_prep_schema_json, portal_schema_json, make_session_config
+from .datapackage import CfdeDataPackage, constituent_schema_json, portal_prep_schema_json, portal_schema_json, make_session_config, response_json, widen_session_pool, parse_timestamp, make_parent_dirs
 from .registry import Registry, nochange, terms
 from .submission import Submission
+from .progress import SqliteProgress
 
 logger = logging.getLogger(__name__)
 
@@ -34,11 +37,48 @@ class Release (object):
     content_path_root = '/var/tmp/cfde_deriva_submissions'
     next_rel_descr = 'future release candidates'
 
+    # release status -> status after purging its catalog
+    _PURGE_STATUS_MAP = {
+        terms.cfde_registry_rel_status.planning: terms.cfde_registry_rel_status.rejected,
+        terms.cfde_registry_rel_status.pending: terms.cfde_registry_rel_status.rejected,
+        terms.cfde_registry_rel_status.content_ready: terms.cfde_registry_rel_status.rejected,
+        terms.cfde_registry_rel_status.content_error: terms.cfde_registry_rel_status.content_error,
+        terms.cfde_registry_rel_status.rejected: terms.cfde_registry_rel_status.rejected,
+        terms.cfde_registry_rel_status.public_release: terms.cfde_registry_rel_status.obsoleted,
+        terms.cfde_registry_rel_status.obsoleted: terms.cfde_registry_rel_status.obsoleted,
+        terms.cfde_registry_rel_status.ops_error: terms.cfde_registry_rel_status.ops_error,
+    }
+
+    # statuses where build() has nothing left to do
+    _TERMINAL_STATUSES = frozenset({
+        terms.cfde_registry_rel_status.content_ready,
+        terms.cfde_registry_rel_status.content_error,
+        terms.cfde_registry_rel_status.rejected,
+        terms.cfde_registry_rel_status.public_release,
+        terms.cfde_registry_rel_status.obsoleted,
+    })
+
+    # statuses always purged in 'auto' purge_mode
+    _JUNK_STATUSES = frozenset({
+        terms.cfde_registry_rel_status.ops_error,
+        terms.cfde_registry_rel_status.rejected,
+        terms.cfde_registry_rel_status.content_error,
+    })
+
+    # statuses purged in 'auto' purge_mode when older than current release
+    _STALE_STATUSES = frozenset({
+        terms.cfde_registry_rel_status.planning,
+        terms.cfde_registry_rel_status.pending,
+        terms.cfde_registry_rel_status.content_ready,
+        terms.cfde_registry_rel_status.obsoleted,
+    })
+
     @classmethod
     def by_id(cls, server, registry, release_id, archive_headers_map=None):
         """Construct an instance bound to an existing entry in the registry"""
         rel_row, dcc_datapackages = registry.get_release(release_id)
-        release = cls(server, registry, rel_row['id'], dcc_datapackages=dcc_datapackages, archive_headers_map=archive_headers_map)
+        # an empty constituent map still falls back to automatic draft config
+        release = cls(server, registry, rel_row['id'], dcc_datapackages=dcc_datapackages or None, archive_headers_map=archive_headers_map)
         return release
 
     def __init__(self, server, registry, id, dcc_datapackages=None, archive_headers_map=None):
@@ -63,7 +103,7 @@ class Release (object):
         self.release_id = id
         self.archive_headers_map = archive_headers_map
 
-        if dcc_datapackages:
+        if dcc_datapackages is not None:
             self.dcc_datapackages = {}
             for dcc_id, dp in dcc_datapackages.items():
                 if isinstance(dp, str):
@@ -78,16 +118,14 @@ class Release (object):
         else:
             self.dcc_datapackages = registry.get_latest_approved_datapackages()
 
-        # check filesystem config early to abort ASAP on errors
-        # TBD: check permissions for safe service config?
-        os.makedirs(os.path.dirname(self.ingest_sqlite_filename), exist_ok=True)
-        os.makedirs(os.path.dirname(self.portal_prep_sqlite_filename), exist_ok=True)
+        # scratch dirs are created lazily by build(), since purge/publish never need them
 
     @classmethod
-    def purge_multiple(cls, server, registry, purge_mode='auto'):
+    def purge_multiple(cls, server, registry, purge_mode='auto', archive_headers_map=None):
         """Purge multiple release catalogs, updating records appropriately
 
         :param purge_mode: Target selection mode string (default 'auto')
+        :param archive_headers_map: A pass-through for Release.__init__(...)
 
         Supported purge_mode values:
         - 'auto': heuristically select likely dead-end releases
@@ -101,20 +139,29 @@ class Release (object):
         if current is None:
             raise NotImplementedError("Auto-purge logic not defined when current release catalog is not determined.")
 
-        release_rows = list(registry.list_releases(sortby="RCT"))
-        idx_by_id = {
-            release_rows[i]["id"]: i
-            for i in range(len(release_rows))
-        }
+        # only fetch rows that could possibly be purged in 'auto' mode
+        release_rows = list(registry.list_releases(
+            sortby="RCT",
+            statuses=None if purge_mode == 'ALL' else cls._JUNK_STATUSES.union(cls._STALE_STATUSES),
+        ))
+        publ_time = parse_timestamp(current.rel_row["RCT"])
+        newer = [
+            parse_timestamp(rel_row["RCT"]) >= publ_time
+            for rel_row in release_rows
+        ]
 
         # find protection boundaries
         # - current published release
         # - most recent obsolete release
         # - every non-error catalog newer than current published release
-        publ_idx = idx_by_id[current.release_id]
-        protect = {publ_idx}
-        for i in range(publ_idx - 1, -1, -1):
-            if release_rows[i]["status"] == terms.cfde_registry_rel_status.obsoleted:
+        protect = {
+            i
+            for i in range(len(release_rows))
+            if release_rows[i]["id"] == current.release_id
+        }
+        obsoleted = terms.cfde_registry_rel_status.obsoleted
+        for i in range(len(release_rows) - 1, -1, -1):
+            if not newer[i] and release_rows[i]["status"] == obsoleted:
                 protect.add(i)
                 break
 
@@ -124,32 +171,49 @@ class Release (object):
                 rel_row['action'] = 'ALL'
             elif i in protect:
                 rel_row['action'] = 'protect'
-            elif rel_row["status"] in {
-                    terms.cfde_registry_rel_status.ops_error,
-                    terms.cfde_registry_rel_status.rejected,
-                    terms.cfde_registry_rel_status.content_error,
-            }:
+            elif rel_row["status"] in cls._JUNK_STATUSES:
                 rel_row['action'] = 'junk'
-            elif rel_row["status"] in {
-                    terms.cfde_registry_rel_status.planning,
-                    terms.cfde_registry_rel_status.pending,
-                    terms.cfde_registry_rel_status.content_ready,
-                    terms.cfde_registry_rel_status.obsoleted,
-            }:
-                rel_row['action'] = 'protect' if i >= publ_idx else 'stale'
+            elif rel_row["status"] in cls._STALE_STATUSES:
+                rel_row['action'] = 'protect' if newer[i] else 'stale'
             else:
                 rel_row['action'] = 'protect'
 
+        purge_actions = frozenset({'stale', 'junk', 'ALL'})
+        purge_this = []
         logger.info('Purging in mode=%r:' % (purge_mode,))
         for i in range(len(release_rows)):
             rel_row = release_rows[i]
             rel_row['idx'] = i
             if rel_row['ermrest_url'] is not None:
                 logger.info('%(idx)6.d  %(RCT)s  %(id)s  %(action)-6s  %(status)-12s  %(ermrest_url)s' % rel_row)
-            if rel_row['action'] in {'stale', 'junk', 'ALL'} \
+            if rel_row['action'] in purge_actions \
                and rel_row['ermrest_url'] is not None:
-                release = cls.by_id(server, registry, rel_row['id'])
+                # purge() does not need the constituent datapackages
+                purge_this.append(cls(server, registry, rel_row['id'], dcc_datapackages={}, archive_headers_map=archive_headers_map))
+
+        # catalog deletion is latency-bound, so overlap a bounded number of them
+        max_workers = int(os.getenv('CFDE_PURGE_WORKERS', '8'))
+        if max_workers <= 1:
+            for release in purge_this:
                 release.purge()
+            return
+
+        failed_exc = None
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(release.purge): release
+                for release in purge_this
+            }
+            for future in as_completed(futures):
+                release = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error('Failed to purge release %r: %s' % (release.release_id, e))
+                    if failed_exc is None:
+                        failed_exc = e
+        if failed_exc is not None:
+            raise failed_exc
 
     @classmethod
     def configure_release_catalog(cls, registry, catalog, id, provision=False):
@@ -171,8 +235,14 @@ class Release (object):
         canon_dp.apply_custom_config() # get the chaise hints deloyed
         return catalog
 
-    def provision(self):
-        rel, dcc_datapackages = self.registry.get_release(self.release_id)
+    def provision(self, rel_row=None):
+        """Idempotently provision release catalog, returning the release row.
+
+        :param rel_row: Optional, already fetched release row to reuse.
+        """
+        if rel_row is None:
+            rel_row, dcc_datapackages = self.registry.get_release(self.release_id)
+        rel = rel_row
         if rel['ermrest_url'] is not None:
             return rel
 
@@ -187,9 +257,15 @@ class Release (object):
             self.registry.update_release(
                 self.release_id,
                 ermrest_url=catalog.get_server_uri(),
+                catalog_id=catalog.catalog_id,
             )
             logger.debug('New catalog registered for release')
-            return self.registry.get_release(self.release_id)[0]
+            rel = dict(rel)
+            rel.update({
+                'ermrest_url': catalog.get_server_uri(),
+                'catalog_id': catalog.catalog_id,
+            })
+            return rel
         except Exception as e:
             et, ev, tb = sys.exc_info()
             logger.debug(''.join(traceback.format_exception(et, ev, tb)))
@@ -213,6 +289,8 @@ class Release (object):
         rel_row = self.rel_row
         if rel_row['ermrest_url'] is None:
             raise exception.StateError('Catalog %(id)s ermrest_url=%(ermrest_url)r does not have a catalog_id' % rel_row)
+        if rel_row.get('catalog_id') is not None:
+            return rel_row['catalog_id']
         return urlunquote(rel_row['ermrest_url'].split('/')[-1])
 
     def purge(self):
@@ -223,16 +301,7 @@ class Release (object):
         try:
             catalog_id = self.catalog_id
 
-            new_state = {
-                terms.cfde_registry_rel_status.planning: terms.cfde_registry_rel_status.rejected,
-                terms.cfde_registry_rel_status.pending: terms.cfde_registry_rel_status.rejected,
-                terms.cfde_registry_rel_status.content_ready: terms.cfde_registry_rel_status.rejected,
-                terms.cfde_registry_rel_status.content_error: terms.cfde_registry_rel_status.content_error,
-                terms.cfde_registry_rel_status.rejected: terms.cfde_registry_rel_status.rejected,
-                terms.cfde_registry_rel_status.public_release: terms.cfde_registry_rel_status.obsoleted,
-                terms.cfde_registry_rel_status.obsoleted: terms.cfde_registry_rel_status.obsoleted,
-                terms.cfde_registry_rel_status.ops_error: terms.cfde_registry_rel_status.ops_error,
-            }.get(status, terms.cfde_registry_rel_status.ops_error)
+            new_state = self._PURGE_STATUS_MAP.get(status, terms.cfde_registry_rel_status.ops_error)
 
             if status != new_state:
                 logger.debug('Changing release %r status %s -> %s' % (self.release_id, status, new_state))
@@ -246,7 +315,7 @@ class Release (object):
                     mesg = 'Catalog %r for release %r already purged?' % (catalog_id, self.release_id)
                 else:
                     raise
-            self.registry.update_release(self.release_id, ermrest_url=None, browse_url=None, summary_url=None)
+            self.registry.update_release(self.release_id, ermrest_url=None, catalog_id=None, browse_url=None, summary_url=None)
             logger.info(mesg)
             return True
         except exception.StateError:
@@ -259,13 +328,24 @@ class Release (object):
         try:
             # find previous release currently bound to publish_id
             res = server.get('/ermrest/alias/%s' % urlquote(publish_id))
-            aliasdoc = res.json()
+            aliasdoc = response_json(res)
             if aliasdoc.get('alias_target') is not None:
-                # HACK: search release by pattern-match on ermrest_url
-                pattern = '/%s$' % urlquote(aliasdoc['alias_target'])
-                rows = registry._catalog.get('/entity/CFDE:release/ermrest_url::regexp::%s' % (urlquote(pattern),)).json()
-                if len(rows) > 1:
-                    raise NotImplementedError('Found more than one release matching ermrest_url ::regexp:: %r:\n%r' % (pattern, rows))
+                qtarget = urlquote(aliasdoc['alias_target'])
+                rows = None
+                if registry.has_release_catalog_id:
+                    try:
+                        # use indexed lookup on catalog_id
+                        rows = response_json(registry._catalog.get('/entity/CFDE:release/catalog_id=%s' % (qtarget,)))
+                    except requests.exceptions.HTTPError as e:
+                        if e.response.status_code not in (requests.codes.bad_request, requests.codes.conflict):
+                            raise
+                        logger.debug('Falling back to ermrest_url search after catalog_id lookup failed: %s' % (e,))
+                if not rows:
+                    # HACK: search release by pattern-match on ermrest_url, i.e. if catalog_id not yet migrated or backfilled
+                    pattern = '/%s$' % qtarget
+                    rows = response_json(registry._catalog.get('/entity/CFDE:release/ermrest_url::regexp::%s' % (urlquote(pattern),)))
+                    if len(rows) > 1:
+                        raise NotImplementedError('Found more than one release matching ermrest_url ::regexp:: %r:\n%r' % (pattern, rows))
                 if rows:
                     prev_release = Release.by_id(server, registry, rows[0]['id'])
                     if prev_release.release_id in suppress_ids:
@@ -282,6 +362,7 @@ class Release (object):
     def publish(self, publish_id='1'):
         """Adjust ermrest catalog alias to publish this release"""
         rel_row = self.rel_row
+        qpid = urlquote(publish_id)
 
         if rel_row.get('status') not in {
                 terms.cfde_registry_rel_status.content_ready,
@@ -291,7 +372,7 @@ class Release (object):
             raise exception.StateError('Release %(id)s cannot be published with status=%(status)r ermrest_url=%(ermrest_url)r' % rel_row)
 
         res = self.server.get('/ermrest/')
-        if not res.json().get('features', {}).get('catalog_alias', False):
+        if not response_json(res).get('features', {}).get('catalog_alias', False):
             raise exception.StateError('The server does not support catalog aliasing features!')
 
         prev_release = Release.find_published_release(
@@ -302,7 +383,7 @@ class Release (object):
         )
 
         res = self.server.put(
-            '/ermrest/alias/%s' % urlquote(publish_id),
+            '/ermrest/alias/%s' % qpid,
             json={
                 "id": publish_id,
                 "owner": [
@@ -313,7 +394,7 @@ class Release (object):
             }
         )
         res.raise_for_status()
-        aliasdoc = res.json()
+        aliasdoc = response_json(res)
         self.registry.update_release(
             self.release_id,
             status=terms.cfde_registry_rel_status.public_release,
@@ -331,6 +412,7 @@ class Release (object):
         """Remove user favorites from registry for terms not present in this catalog."""
         rel_row = self.rel_row
         cat_id = self.catalog_id
+        qcat = urlquote(cat_id)
 
         if rel_row.get('status') not in {
                 terms.cfde_registry_rel_status.content_ready,
@@ -358,17 +440,19 @@ class Release (object):
                 "phenotype_association_type",
         ]:
             logger.info("Checking %s for orphaned favorites" % (vocab_tname,))
+            qvocab = urlquote(vocab_tname)
+            qfavorite = urlquote('favorite_' + vocab_tname)
 
             def get_terms(url):
                 batch_size = 5000
                 after = None
                 while True:
-                    rows = self.server.get(
+                    rows = response_json(self.server.get(
                         url
                         + '@sort(id)'
                         + (('@after(%s)' % urlquote(after)) if after is not None else '')
                         + ('?limit=%d' % batch_size)
-                    ).json()
+                    ))
                     if not rows:
                         break
                     after = rows[-1]['id']
@@ -379,8 +463,8 @@ class Release (object):
                 term
                 for term in get_terms(
                         '/ermrest/catalog/registry/attributegroup/CFDE:%s/id:=%s' % (
-                            urlquote('favorite_' + vocab_tname),
-                            urlquote(vocab_tname),
+                            qfavorite,
+                            qvocab,
                         )
                 )
             }
@@ -388,8 +472,8 @@ class Release (object):
                 term
                 for term in get_terms(
                         '/ermrest/catalog/%s/attributegroup/CFDE:%s/id' % (
-                            urlquote(cat_id),
-                            urlquote(vocab_tname),
+                            qcat,
+                            qvocab,
                         )
                 )
             }
@@ -401,8 +485,8 @@ class Release (object):
             for term in orphans:
                 r = self.server.delete(
                     '/ermrest/catalog/registry/entity/CFDE:%s/%s=%s' % (
-                        urlquote('favorite_' + vocab_tname),
-                        urlquote(vocab_tname),
+                        qfavorite,
+                        qvocab,
                         urlquote(term),
                     )
                 )
@@ -418,6 +502,7 @@ class Release (object):
         """
         rel_row = self.rel_row
         cat_id = self.catalog_id
+        qcat = urlquote(cat_id)
 
         if rel_row.get('status') not in {
                 terms.cfde_registry_rel_status.content_ready,
@@ -446,19 +531,20 @@ class Release (object):
         ]:
             authoritative = {}
             existing = {}
+            qvocab = urlquote(vocab_tname)
 
             def get_batches(baseurl, filterpart=''):
                 after = ''
                 while True:
-                    rows = self.server.get(
+                    rows = response_json(self.server.get(
                         baseurl
-                        + '/attribute/CFDE:' + urlquote(vocab_tname)
+                        + '/attribute/CFDE:' + qvocab
                         + filterpart
                         + '/id,resource_markdown'
                         + '@sort(id)'
                         + after
                         + '?limit=500'
-                    ).json()
+                    ))
                     if rows:
                         after = '@after(%s)' % (urlquote(rows[-1]['id']),)
                         yield rows
@@ -474,7 +560,7 @@ class Release (object):
             nreg = len(authoritative)
 
             # get all release terms since we need to know which IDs exist
-            for batch in get_batches('/ermrest/catalog/%s' % (urlquote(cat_id),)):
+            for batch in get_batches('/ermrest/catalog/%s' % (qcat,)):
                 existing.update({
                     row['id']: row['resource_markdown']
                     for row in batch
@@ -491,8 +577,8 @@ class Release (object):
             while need_update:
                 self.server.put(
                     '/ermrest/catalog/%s/attributegroup/CFDE:%s/id;resource_markdown' % (
-                        urlquote(cat_id),
-                        urlquote(vocab_tname),
+                        qcat,
+                        qvocab,
                     ),
                     json=need_update[0:500],
                 ).json() # discard response content
@@ -517,23 +603,19 @@ class Release (object):
         # based on what we are trying to do during sequence
         next_error_state = terms.cfde_registry_rel_status.ops_error
 
-        try:
-            os.makedirs(os.path.dirname(self.restart_marker_filename), exist_ok=True)
-            with open(self.restart_marker_filename, 'r') as f:
-                progress = json.load(f)
-            logger.info("Loaded restart marker file %s" % self.restart_marker_filename)
-        except:
-            progress = dict()
+        # TBD: check permissions for safe service config?
+        make_parent_dirs(
+            self.ingest_sqlite_filename,
+            self.portal_prep_sqlite_filename,
+            self.progress_sqlite_filename,
+        )
+        progress_conn = SqliteProgress.connect(self.progress_sqlite_filename)
 
         try:
+            self.import_legacy_progress(progress_conn)
+
             # shortcut if already in terminal state
-            if rel['status'] in {
-                    terms.cfde_registry_rel_status.content_ready,
-                    terms.cfde_registry_rel_status.content_error,
-                    terms.cfde_registry_rel_status.rejected,
-                    terms.cfde_registry_rel_status.public_release,
-                    terms.cfde_registry_rel_status.obsoleted,
-            }:
+            if rel['status'] in self._TERMINAL_STATUSES:
                 logger.info('Skipping ingest for release %s with existing terminal status %s.' % (
                     self.release_id,
                     rel['status'],
@@ -542,18 +624,24 @@ class Release (object):
                 return rel
 
             logger.info('Provisioning catalog...')
-            rel = self.provision()
-            catalog = self.server.connect_ermrest(
-                Submission.extract_catalog_id(self.server, rel['ermrest_url'])
-            )
+            rel = self.provision(rel_row=rel)
+            # prefer the registered catalog_id over re-parsing ermrest_url
+            catalog_id = rel.get('catalog_id')
+            if catalog_id is None:
+                catalog_id = Submission.extract_catalog_id(self.server, rel['ermrest_url'])
+            catalog = self.server.connect_ermrest(catalog_id)
 
             # this includes portal schema and built-in vocabs
             logger.info('Provisioning sqlite...')
-            Submission.provision_sqlite(constituent_schema_json, self.ingest_sqlite_filename)
-            Submission.provision_sqlite(portal_prep_schema_json, self.portal_prep_sqlite_filename)
+            Submission.provision_sqlite(
+                portal_prep_schema_json,
+                self.portal_prep_sqlite_filename,
+                attach={'submission': (constituent_schema_json, self.ingest_sqlite_filename)},
+                defer_indexes={'submission'},
+            )
 
             logger.info('Loading %s release constituents...' % len(self.dcc_datapackages))
-            for dprow in self.dcc_datapackages.values():
+            def prepare_constituent(dprow):
                 submission = Submission(
                     self.server,
                     self.registry,
@@ -564,44 +652,64 @@ class Release (object):
                     self.archive_headers_map,
                     skip_dcc_check=True,
                 )
-                submission.retrieve_datapackage(
+                submission.retrieve_and_unpack_datapackage(
                     submission.archive_url,
                     submission.download_filename,
-                    submission.archive_headers_map
-                )
-                submission.unpack_datapackage(
-                    submission.download_filename,
-                    submission.content_path
+                    submission.content_path,
+                    submission.archive_headers_rules
                 )
                 # truncate validation, since we did that during submission
                 # re-check for storage corruption?
                 submission.bdbag_validate(submission.content_path)
                 # re-check if portal model has changed since submission was checked?
                 submission.datapackage_model_check(submission.content_path)
-
-                submission.load_sqlite(
-                    submission.content_path,
-                    self.ingest_sqlite_filename,
-                    progress=progress.setdefault('sqlite_load', {}).setdefault(dprow['id'], {}),
-                )
-                self.dump_progress(progress)
+                return submission
+
+            # pipeline: download/unpack/validate upcoming constituents in the
+            # background while the single sqlite writer loads the current one
+            lookahead = int(os.getenv('CFDE_PREP_WORKERS', '2'))
+            dprows = iter(self.dcc_datapackages.values())
+            pending = collections.deque()
+            with ThreadPoolExecutor(max_workers=max(lookahead, 1)) as prep:
+                def fill_pending():
+                    for dprow in itertools.islice(dprows, max(lookahead, 1) - len(pending)):
+                        pending.append((dprow, prep.submit(prepare_constituent, dprow)))
+
+                fill_pending()
+                while pending:
+                    dprow, future = pending.popleft()
+                    submission = future.result()
+                    fill_pending()
+                    submission.load_sqlite(
+                        submission.content_path,
+                        self.ingest_sqlite_filename,
+                        progress=SqliteProgress(progress_conn, 'sqlite_load', dprow['id']),
+                    )
+            Submission.index_sqlite(constituent_schema_json, self.ingest_sqlite_filename)
 
             # do this once w/ all content now loaded in sqlite
             logger.info('Preparing derived data...')
             Submission.prepare_sqlite_derived_data(
                 self.portal_prep_sqlite_filename,
-                progress=progress.setdefault('etl', {}),
+                progress=SqliteProgress(progress_conn, 'etl'),
                 attach={'submission': self.ingest_sqlite_filename},
+                source_generation=','.join([
+                    SqliteProgress(progress_conn, 'sqlite_load', dprow['id'])['generation']
+                    for dprow in self.dcc_datapackages.values()
+                ]),
             )
             Submission.download_resource_markdown_to_sqlite(self.registry, self.portal_prep_sqlite_filename)
             logger.info('Uploading all release content...')
-            self.dump_progress(progress)
-            Submission.upload_sqlite_raw_content(catalog, self.ingest_sqlite_filename, progress=progress.setdefault('upload_raw', {}))
-            Submission.upload_sqlite_content(catalog, self.portal_prep_sqlite_filename, progress=progress.setdefault('upload', {}))
+            Submission.upload_sqlite_all_content(
+                catalog,
+                self.ingest_sqlite_filename,
+                self.portal_prep_sqlite_filename,
+                raw_progress=SqliteProgress(progress_conn, 'upload_raw'),
+                progress=SqliteProgress(progress_conn, 'upload'),
+            )
             logger.info('All release content successfully uploaded to %(ermrest_url)s' % rel)
             browse_url = '/chaise/recordset/#%s/CFDE:file' % catalog.catalog_id
             summary_url = '/pdashboard.html?catalogId=%s' % catalog.catalog_id
-            self.dump_progress(progress)
 
             failed = False
 
@@ -610,7 +718,7 @@ class Release (object):
             failed, failed_exc = True, e
             raise
         finally:
-            self.dump_progress(progress)
+            progress_conn.close()
             if failed:
                 status, diagnostics = next_error_state, diagnostics
                 if failed_exc is not None:
@@ -646,11 +754,6 @@ class Release (object):
             )
             logger.debug('Release %s status successfully updated.' % (self.release_id,))
 
-    def dump_progress(self, progress):
-        with open(self.restart_marker_filename, 'w') as f:
-            json.dump(progress, f, indent=2)
-        logger.info("Dumped restart marker file %s" % self.restart_marker_filename)
-
     @property
     def ingest_sqlite_filename(self):
         """Return ingest_sqlite_filename scratch C2M2 DB target name for given release id.
@@ -675,12 +778,51 @@ class Release (object):
         # naive mapping should be OK for UUIDs...
         return '%s/databases/%s_portal_prep.sqlite3' % (self.content_path_root, self.release_id)
 
-    @property
-    def restart_marker_filename(self):
-        """Return restart_marker JSON file name for given release id.
+    def import_legacy_progress(self, progress_conn):
+        """Import restart markers left by builds which predate the progress database.
+
+        Such builds recorded a JSON progress dict in
+        legacy_restart_marker_filename. Only the sqlite_load and upload
+        markers are imported, and only into an empty progress database;
+        the ETL simply re-runs since its markers now depend on the load
+        generation. The legacy file is then renamed so it is not
+        imported again.
         """
+        if progress_conn.execute('SELECT true FROM progress LIMIT 1').fetchone() is not None:
+            return
+
+        filename = self.legacy_restart_marker_filename
+        try:
+            with open(filename, 'r') as f:
+                progress = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            logger.warning('Ignoring unreadable legacy restart marker file %s: %s' % (filename, e))
+            return
+
+        for dp_id, markers in progress.get('sqlite_load', {}).items():
+            SqliteProgress(progress_conn, 'sqlite_load', dp_id).update(markers)
+        for phase in ['upload_raw', 'upload']:
+            SqliteProgress(progress_conn, phase).update(progress.get(phase, {}))
+        os.replace(filename, filename + '.imported')
+        logger.info('Imported legacy restart marker file %s' % (filename,))
+
+    @property
+    def legacy_restart_marker_filename(self):
+        """Return legacy restart_marker JSON file name for given release id."""
         return '%s/progress/%s.json' % (self.content_path_root, self.release_id)
 
+    @property
+    def progress_sqlite_filename(self):
+        """Return progress_sqlite_filename restart marker DB name for given release id.
+
+        We use a deterministic mapping of release id to
+        progress_sqlite_filename so that we can do reentrant processing.
+
+        """
+        return '%s/databases/%s_progress.sqlite3' % (self.content_path_root, self.release_id)
+
 def main(subcommand, *args):
     """Ugly test-harness for data release.
 
@@ -736,6 +878,9 @@ def main(subcommand, *args):
     session_config = make_session_config()
     registry = Registry('https', servername, credentials=credential, session_config=session_config)
     server = DerivaServer('https', servername, credential, session_config=session_config)
+    # one pooled session per binding is shared by every Release and worker thread below
+    widen_session_pool(registry._catalog)
+    widen_session_pool(server)
 
     need_dcc_appr = os.getenv('DRAFT_NEED_DCC', 'true').lower() in {'t', 'y', 'true', 'yes'}
     need_cfde_appr = os.getenv('DRAFT_NEED_CFDE', 'false').lower() in {'t', 'y', 'true', 'yes'}
@@ -768,7 +913,11 @@ def main(subcommand, *args):
         release, dcc_datapackages = registry.register_release(rel_id, dcc_datapackages, description)
         # also update submission states
         datapackages = { dp_row['id'] for dp_row in dcc_datapackages.values() }
-        for dp_row in registry.list_datapackages(sortby='submission_time'):
+        latest_dates = {
+            dcc_id: parse_timestamp(dp_row['submission_time'])
+            for dcc_id, dp_row in dcc_datapackages.items()
+        }
+        for dp_row in registry.iter_datapackages():
             next_state = dp_row['status']
             if dp_row['id'] in datapackages:
                 if dp_row['status'] != terms.cfde_registry_dp_status.release_pending:
@@ -778,10 +927,9 @@ def main(subcommand, *args):
                     terms.cfde_registry_dp_status.content_ready,
             }:
                 next_state = terms.cfde_registry_dp_status.content_ready
-                dcc_latest = dcc_datapackages.get(dp_row['submitting_dcc'])
-                if dcc_latest is not None:
-                    this_date = dateutil.parser.parse(dp_row['submission_time'])
-                    latest_date = dateutil.parser.parse(dcc_latest['submission_time'])
+                latest_date = latest_dates.get(dp_row['submitting_dcc'])
+                if latest_date is not None:
+                    this_date = parse_timestamp(dp_row['submission_time'])
                     if this_date < latest_date:
                         next_state = terms.cfde_registry_dp_status.obsoleted
 
@@ -842,7 +990,12 @@ def main(subcommand, *args):
         else:
             assert(False)
     elif subcommand in {'purge-ALL', 'purge-auto'}:
-        Release.purge_multiple(server, registry, purge_mode={'purge-ALL': 'ALL', 'purge-auto': 'auto'}[subcommand])
+        Release.purge_multiple(
+            server,
+            registry,
+            purge_mode={'purge-ALL': 'ALL', 'purge-auto': 'auto'}[subcommand],
+            archive_headers_map=archive_headers_map,
+        )
     else:
         raise ValueError('unknown sub-command "%s"' % subcommand)
 
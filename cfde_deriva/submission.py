@@ -5,7 +5,6 @@ import sys
 import traceback
 import re
 import datetime
-import dateutil.parser
 import shutil
 import zipfile
 import tarfile
@@ -15,23 +14,167 @@ import csv
 import uuid
 import pkgutil
 import tempfile
+import contextlib
+import io
+import hashlib
+import functools
+import concurrent.futures
+import multiprocessing
+import threading
 import sqlite3
+import struct
+import mmap
+import errno
+import subprocess
 import requests
-from glob import glob
-from bdbag import bdbag_api
-from bdbag.bdbagit import BagError, BagValidationError
+import urllib3.exceptions
+from urllib3.util.retry import Retry
+from bdbag.bdbagit import BDBag, BagError, BagValidationError, BaggingInterruptedError, ChecksumMismatch
 import frictionless
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import re2
+except ImportError:
+    re2 = None
 
 from deriva.core import DerivaServer, get_credential, init_logging, urlquote
 
 from . import exception, tableschema
 from .registry import Registry, WebauthnUser, WebauthnAttribute, nochange, terms
-from .datapackage import CfdeDataPackage, submission_schema_json, portal_prep_schema_json, portal_schema_json, registry_schema_json, sql_literal, sql_identifier, make_session_config, tables_topo_sorted
+from .datapackage import CfdeDataPackage, submission_schema_json, portal_prep_schema_json, portal_schema_json, registry_schema_json, sql_literal, sql_identifier, make_session_config, json_loads, json_dumps, tables_topo_sorted, tables_topo_levels, sqlite_tune_bulk, parse_timestamp, make_parent_dirs
 from .cfde_login import get_archive_headers_map
+from .progress import SqliteProgress
 
 
 logger = logging.getLogger(__name__)
 
+# cfde_keywords tokenization rules for the derived-data ETL
+if re2 is not None:
+    # RE2 matches in linear time without backtracking; its \s is ASCII-only,
+    # so spell out the whitespace Python's unicode \\s would match
+    _keyword_split_re = re2.compile(
+        r'[\t-\r\x1c-\x20\x{85}\x{a0}\x{1680}\x{2000}-\x{200a}\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}'
+        r'+/.,;()\[\]{}\'"_~%&|]'
+    )
+else:
+    _keyword_split_re = re.compile('[\\s+/.,;()[\\]{}\'"_~%&|]')
+_keyword_strip_chars = '-:+/.,;()[]{}\'"~%&|'
+_keyword_stopwords = frozenset({
+    'an', 'the', 'of', 'as', 'at', 'to', 'on',
+    'or', 'and', 'is', 'by', 'not', 'from', 'are',
+})
+
+def _bag_file_hashes(args):
+    """Compute (rel_path, f_hashes, hashes) for one bag manifest entry.
+
+    Drop-in for bagit's _calc_hashes() which hashes via a file.read()
+    loop. A single algorithm is delegated to hashlib.file_digest()
+    when available (Python 3.11+), otherwise all hashers are fed from
+    one reusable buffer. Both paths release the GIL while hashing.
+    """
+    base_path, rel_path, hashes, algorithms = args
+    full_path = os.path.join(base_path, rel_path)
+    algs = [ alg for alg in hashes if alg in algorithms ]
+    try:
+        with open(full_path, 'rb', buffering=0) as f:
+            if len(algs) == 1 and hasattr(hashlib, 'file_digest'):
+                f_hashes = { algs[0]: hashlib.file_digest(f, algs[0]).hexdigest() }
+            else:
+                hashers = { alg: hashlib.new(alg) for alg in algs }
+                buf = bytearray(FastBDBag.hash_buffer_size)
+                view = memoryview(buf)
+                while True:
+                    nbytes = f.readinto(buf)
+                    if not nbytes:
+                        break
+                    for h in hashers.values():
+                        h.update(view[:nbytes])
+                f_hashes = { alg: h.hexdigest() for alg, h in hashers.items() }
+    except OSError as e:
+        # same convention as bagit: the error text becomes a mismatching digest
+        msg = 'Could not read %s: %s' % (full_path, e)
+        f_hashes = { alg: msg for alg in algs }
+    return rel_path, f_hashes, hashes
+
+def _frictionless_validate_task(task_descriptor):
+    """Validate one frictionless InquiryTask descriptor in a worker process.
+
+    Returns the report descriptor, like frictionless's own parallel
+    mode, since reports are rebuilt by the parent.
+    """
+    return frictionless.InquiryTask(task_descriptor).run().to_dict()
+
+class _MappedFile (mmap.mmap):
+    """Read-only memory map usable as a zipfile.ZipFile file object.
+
+    Python < 3.13 mmap lacks the seekable() method zipfile expects.
+    """
+    def seekable(self):
+        return True
+
+class FastBDBag (BDBag):
+    """BDBag with threaded manifest checksum verification.
+
+    The stock validator forks a multiprocessing pool to hash payload
+    files. Since hashlib releases the GIL for bulk updates, a thread
+    pool achieves the same parallelism without forking, which is also
+    safe when validation runs in a background thread of a process
+    that has other threads.
+    """
+    hash_buffer_size = 1024*1024
+
+    def _validate_entries(self, processes, callback=None):
+        """Verify payload file hashes against the manifests.
+
+        Like the stock validator, callback(count, total) is invoked
+        as each file is hashed, and a false result interrupts
+        validation with BaggingInterruptedError.
+        """
+        args = [
+            (self.path, self.normalized_filesystem_names.get(rel_path, rel_path), hashes, self.algorithms)
+            for rel_path, hashes in self.entries.items()
+        ]
+        def check_callback(count):
+            if callback and not callback(count, len(args)):
+                raise BaggingInterruptedError('Bag validation interrupted!')
+
+        hash_results = []
+        if (processes or 1) <= 1 or len(args) < 2:
+            # not worth a thread pool
+            for a in args:
+                hash_results.append(_bag_file_hashes(a))
+                check_callback(len(hash_results))
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=processes) as pool:
+                futures = [ pool.submit(_bag_file_hashes, a) for a in args ]
+                try:
+                    for future in futures:
+                        hash_results.append(future.result())
+                        check_callback(len(hash_results))
+                except BaggingInterruptedError:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        errors = []
+        for rel_path, f_hashes, hashes in hash_results:
+            for alg, computed_hash in f_hashes.items():
+                stored_hash = hashes[alg]
+                if stored_hash.lower() != computed_hash:
+                    e = ChecksumMismatch(rel_path, alg, stored_hash.lower(), computed_hash)
+                    logger.warning(str(e))
+                    errors.append(e)
+
+        if errors:
+            raise BagValidationError('Bag validation failed', errors)
+
 class Submission (object):
     """Processing support for C2M2 datapackage submissions.
 
@@ -80,6 +223,42 @@ class Submission (object):
 
     # Allow monkey-patching or other caller-driven reconfig in future?
     content_path_root = '/var/tmp/cfde_deriva_submissions'
+
+    # stop frictionless checks of a resource after this many errors during ingest
+    validate_limit_errors = 100
+
+    # coalesce archive download writes into chunks of this many bytes
+    download_buffer_size = 8*1024*1024
+
+    # extract zip archives smaller than this (uncompressed) without worker threads
+    unpack_parallel_min_bytes = 16*1024*1024
+
+    # load submissions with less TSV content than this into sqlite without worker processes
+    load_parallel_min_bytes = 64*1024*1024
+
+    # tar members up to this size are buffered in memory for writer threads, this many at a time
+    unpack_tar_buffer_max_bytes = 4*1024*1024
+    unpack_tar_buffered_files = 16
+
+    # download archives at least this large as concurrent byte ranges, if the server allows
+    download_ranges_min_bytes = 256*1024*1024
+
+    # datapackage statuses purged by purge_multiple() in 'auto' mode, regardless of age
+    purge_unconditional_statuses = frozenset({
+        terms.cfde_registry_dp_status.ops_error,
+        terms.cfde_registry_dp_status.obsoleted,
+        terms.cfde_registry_dp_status.bag_error,
+        terms.cfde_registry_dp_status.check_error,
+        terms.cfde_registry_dp_status.content_error,
+    })
+
+    # datapackage statuses purged by purge_multiple() in 'auto' mode, if submitted before horizon
+    purge_conditional_statuses = frozenset({
+        terms.cfde_registry_dp_status.submitted,
+        terms.cfde_registry_dp_status.bag_valid,
+        terms.cfde_registry_dp_status.check_valid,
+        terms.cfde_registry_dp_status.content_ready,
+    })
     
     def __init__(self, server, registry, id, dcc_id, archive_url, submitting_user, archive_headers_map=None, skip_dcc_check=False):
         """Represent a stateful processing flow for a C2M2 submission.
@@ -132,15 +311,10 @@ class Submission (object):
         self.review_catalog = None
         self.submitting_user = submitting_user
         self.archive_headers_map = archive_headers_map
-
-        # check filesystem config early to abort ASAP on errors
-        # TBD: check permissions for safe service config?
-        os.makedirs(os.path.dirname(self.download_filename), exist_ok=True)
-        os.makedirs(os.path.dirname(self.ingest_sqlite_filename), exist_ok=True)
-        os.makedirs(os.path.dirname(self.portal_prep_sqlite_filename), exist_ok=True)
-        os.makedirs(os.path.dirname(self.content_path), exist_ok=True)
+        self.archive_headers_rules = self.compile_archive_headers_map(archive_headers_map)
 
     def dump_progress(self, progress):
+        make_parent_dirs(self.restart_marker_filename)
         with open(self.restart_marker_filename, 'w') as f:
             json.dump(progress, f, indent=2)
         logger.info("Dumped restart marker file %s" % self.restart_marker_filename)
@@ -172,9 +346,15 @@ class Submission (object):
             for dp_row in registry.get_latest_approved_datapackages(True, False).values()
         }
 
-        for dp_row in registry.list_datapackages(sortby="submission_time"):
+        if purge_mode == 'ALL':
+            statuses = None
+        else:
+            # let the registry skip rows 'auto' mode would never purge
+            statuses = cls.purge_unconditional_statuses | cls.purge_conditional_statuses
+
+        for dp_row in registry.iter_datapackages(statuses=statuses):
 
-            submission_time = dateutil.parser.parse(dp_row['submission_time'])
+            submission_time = parse_timestamp(dp_row['submission_time'])
             in_past = submission_time < horizon
 
             if purge_mode == 'ALL':
@@ -183,21 +363,10 @@ class Submission (object):
             elif dp_row['id'] in excluding:
                 logger.info("Skipping datapackage %(id)s excluded by heuristic guard." % dp_row)
                 purge_this = False
-            elif dp_row["status"] in {
-                    terms.cfde_registry_dp_status.ops_error,
-                    terms.cfde_registry_dp_status.obsoleted,
-                    terms.cfde_registry_dp_status.bag_error,
-                    terms.cfde_registry_dp_status.check_error,
-                    terms.cfde_registry_dp_status.content_error,
-            }:
+            elif dp_row["status"] in cls.purge_unconditional_statuses:
                 logger.info("Purging datapackage %(id)s with unconditional purge status %(status)s" % dp_row)
                 purge_this = True
-            elif in_past and dp_row["status"] in {
-                    terms.cfde_registry_dp_status.submitted,
-                    terms.cfde_registry_dp_status.bag_valid,
-                    terms.cfde_registry_dp_status.check_valid,
-                    terms.cfde_registry_dp_status.content_ready,
-            }:
+            elif in_past and dp_row["status"] in cls.purge_conditional_statuses:
                 logger.info("Purging past datapackage %(id)s with conditional purge status %(status)s" % dp_row)
                 purge_this = True
             else:
@@ -280,13 +449,19 @@ class Submission (object):
             logger.error('Got exception %s when registering datapackage %s, aborting!' % (e, self.datapackage_id,))
             raise exception.RegistrationError(e)
 
-        try:
-            os.makedirs(os.path.dirname(self.restart_marker_filename), exist_ok=True)
-            with open(self.restart_marker_filename, 'r') as f:
-                progress = json.load(f)
-            logger.info("Loaded restart marker file %s" % self.restart_marker_filename)
-        except:
-            progress = dict()
+        # check filesystem config early to abort ASAP on errors
+        # TBD: check permissions for safe service config?
+        make_parent_dirs(
+            self.download_filename,
+            self.ingest_sqlite_filename,
+            self.portal_prep_sqlite_filename,
+            self.progress_sqlite_filename,
+            self.content_path,
+        )
+        # restart markers let a retried ingest skip already completed sqlite and upload work
+        progress_conn = SqliteProgress.connect(self.progress_sqlite_filename)
+        # runs steps which do not depend on the preceding ones concurrently with them
+        background = concurrent.futures.ThreadPoolExecutor(max_workers=2)
 
         # general sequence (with many idempotent steps)
         failed = True
@@ -311,42 +486,69 @@ class Submission (object):
                 ))
                 return
 
-            self.retrieve_datapackage(self.archive_url, self.download_filename, self.archive_headers_map)
-            self.unpack_datapackage(self.download_filename, self.content_path)
+            # local schema and vocab provisioning does not need the submitted content
+            provision_future = background.submit(
+                self.provision_sqlite,
+                portal_prep_schema_json,
+                self.portal_prep_sqlite_filename,
+                attach={"submission": (submission_schema_json, self.ingest_sqlite_filename)},
+                defer_indexes={"submission"},
+            )
+
+            self.retrieve_and_unpack_datapackage(self.archive_url, self.download_filename, self.content_path, self.archive_headers_rules)
 
             next_error_state = terms.cfde_registry_dp_status.bag_error
             if dp['status'] not in {
                     terms.cfde_registry_dp_status.bag_valid,
                     terms.cfde_registry_dp_status.check_valid,
             }:
-                self.bdbag_validate(self.content_path)
+                # checksum the bag while we check the (JSON-only) datapackage model
+                bag_future = background.submit(self.bdbag_validate, self.content_path, self.bag_fingerprint_filename)
+            else:
+                bag_future = None
+
+            def join_bag_validation():
+                """Wait for background bag validation, recording its outcome"""
+                nonlocal next_error_state, bag_future
+                if bag_future is None:
+                    return
+                saved_state, next_error_state = next_error_state, terms.cfde_registry_dp_status.bag_error
+                # a bag error takes precedence over any concurrent model error
+                bag_future.result()
+                bag_future = None
                 self.registry.update_datapackage(self.datapackage_id, status=terms.cfde_registry_dp_status.bag_valid)
+                next_error_state = saved_state
 
             def dpt_prepare(packagefile):
                 """Prepare lookup tools for packagefile"""
-                with open(packagefile, 'r') as f:
-                    packagedoc = json.load(f)
-                resources = packagedoc.get('resources', [])
+                with open(packagefile, 'rb') as f:
+                    resources = json_loads(f.read()).get('resources', [])
+                # retain only names and paths, not the whole package document
+                rnames = []
                 rname_to_pos = dict()
                 rpath_to_pos = dict()
-                for pos in range(len(resources)):
-                    rname_to_pos[resources[pos].get("name")] = pos
-                    rpath_to_pos[resources[pos].get("path")] = pos
-                return (
-                    { k: v for k, v in rname_to_pos.items() if k is not None },
-                    { k: v for k, v in rpath_to_pos.items() if k is not None },
-                    resources,
-                )
+                for pos, resource in enumerate(resources):
+                    rname = resource.get("name")
+                    rnames.append(rname)
+                    if rname is not None:
+                        rname_to_pos[rname] = pos
+                    rpath = resource.get("path")
+                    if rpath is not None:
+                        rpath_to_pos[rpath] = pos
+                return rname_to_pos, rpath_to_pos, rnames
 
             def dpt_register(content_path, packagefile):
                 """Register resources in frictionless schema"""
-                self.rname_to_pos, self.rpath_to_pos, self.resources = dpt_prepare(packagefile)
-                for pos in range(len(self.resources)):
-                    # this could be a null or repeated name, which we'll reject later...
-                    self.registry.register_datapackage_table(self.datapackage_id, pos, self.resources[pos].get("name"))
+                self.rname_to_pos, self.rpath_to_pos, self.resource_names = dpt_prepare(packagefile)
+                # names could be null or repeated, which we'll reject later...
+                self.registry.register_datapackage_tables(
+                    self.datapackage_id,
+                    self.resource_names,
+                )
 
             def dpt_update1(content_path, packagefile, report):
                 """Update status of resources from frictionless report"""
+                updates = dict()
                 for task in report.tasks:
                     if not hasattr(task, 'resource'):
                         continue
@@ -358,7 +560,8 @@ class Submission (object):
 
                     if task.errors:
                             status = terms.cfde_registry_dpt_status.check_error
-                            diagnostics = 'Tabular resource found %d errors. First error: %s' % (
+                            diagnostics = 'Tabular resource found %s%d errors. First error: %s' % (
+                                'at least ' if len(task.errors) >= self.validate_limit_errors else '',
                                 len(task.errors),
                                 task.errors[0].message
                             )
@@ -366,26 +569,33 @@ class Submission (object):
                         status = nochange
                         diagnostics = nochange
                     num_rows = task.resource.stats.get('rows', nochange)
-                    self.registry.update_datapackage_table(
-                        self.datapackage_id,
-                        self.rname_to_pos[task.resource.name],
-                        status= status,
-                        num_rows= num_rows,
-                        diagnostics= diagnostics
-                    )
+                    updates[self.rname_to_pos[task.resource.name]] = {
+                        'status': status,
+                        'num_rows': num_rows,
+                        'diagnostics': diagnostics,
+                    }
+                # send all resource updates at once rather than per task
+                self.registry.update_datapackage_tables(self.datapackage_id, updates)
+
+            uploaded_positions = set()
 
             def dpt_update2(name, path):
-                """Update status of resource following content upload"""
+                """Note status of resource following content upload, for dpt_flush2()"""
                 try:
-                    pos = self.rname_to_pos[name],
-                    self.registry.update_datapackage_table(
-                        self.datapackage_id,
-                        self.rname_to_pos[name],
-                        status= terms.cfde_registry_dpt_status.content_ready
-                    )
+                    uploaded_positions.add(self.rname_to_pos[name])
                 except KeyError as e:
                     logger.debug("Swallowing dpt_update2 callback for table %s lacking position in datapackage" % (name,))
 
+            def dpt_flush2():
+                """Send all pending dpt_update2 resource updates at once"""
+                updates = {
+                    pos: {'status': terms.cfde_registry_dpt_status.content_ready}
+                    for pos in uploaded_positions
+                }
+                uploaded_positions.clear()
+                if updates:
+                    self.registry.update_datapackage_tables(self.datapackage_id, updates)
+
             def dpt_error2(name, path, diagnostics):
                 try:
                     pos = self.rname_to_pos[name]
@@ -402,21 +612,32 @@ class Submission (object):
                     terms.cfde_registry_dp_status.check_valid,
             }:
                 next_error_state = terms.cfde_registry_dp_status.check_error
-                self.datapackage_model_check(self.content_path, pre_process=dpt_register)
-                self.datapackage_validate(self.content_path, post_process=dpt_update1, check_fkeys=False, check_keys=False)
+                try:
+                    self.datapackage_model_check(self.content_path, pre_process=dpt_register)
+                finally:
+                    join_bag_validation()
+                # keys and fkeys are enforced later by sqlite, and a few errors per table suffice for diagnostics
+                self.datapackage_validate(self.content_path, post_process=dpt_update1, check_fkeys=False, check_keys=False, limit_errors=self.validate_limit_errors)
+
+            join_bag_validation()
 
             next_error_state = terms.cfde_registry_dp_status.ops_error
-            self.provision_sqlite(submission_schema_json, self.ingest_sqlite_filename)
-            self.provision_sqlite(portal_prep_schema_json, self.portal_prep_sqlite_filename)
+            provision_future.result()
             if self.review_catalog is None:
-                self.review_catalog = self.create_review_catalog(self.server, self.registry, self.datapackage_id)
+                # remote catalog creation proceeds while we load and check local content
+                catalog_future = background.submit(self.create_review_catalog, self.server, self.registry, self.datapackage_id)
+            else:
+                catalog_future = None
 
             next_error_state = terms.cfde_registry_dp_status.content_error
-            self.load_sqlite(self.content_path, self.ingest_sqlite_filename, onconflict='abort', table_error_callback=dpt_error2)
+            load_progress = SqliteProgress(progress_conn, 'sqlite_load')
+            # without frictionless, numeric field types are only checked while loading
+            self.load_sqlite(self.content_path, self.ingest_sqlite_filename, onconflict='abort', table_error_callback=dpt_error2, progress=load_progress, check_types=self.frictionless_skipped())
+            self.index_sqlite(submission_schema_json, self.ingest_sqlite_filename)
             self.sqlite_datapackage_check(submission_schema_json, self.content_path, self.ingest_sqlite_filename, table_error_callback=dpt_error2)
             self.registry.update_datapackage(self.datapackage_id, status=terms.cfde_registry_dp_status.check_valid)
 
-            self.prepare_sqlite_derived_data(self.portal_prep_sqlite_filename, attach={"submission": self.ingest_sqlite_filename})
+            self.prepare_sqlite_derived_data(self.portal_prep_sqlite_filename, progress=SqliteProgress(progress_conn, 'etl'), attach={"submission": self.ingest_sqlite_filename}, source_generation=load_progress['generation'])
             self.record_vocab_usage(self.registry, self.portal_prep_sqlite_filename, self.datapackage_id)
             self.download_resource_markdown_to_sqlite(self.registry, self.portal_prep_sqlite_filename)
 
@@ -426,8 +647,25 @@ class Submission (object):
             self.validate_collection_names(self.portal_prep_sqlite_filename)
 
             next_error_state = terms.cfde_registry_dp_status.ops_error
-            self.upload_sqlite_raw_content(self.review_catalog, self.ingest_sqlite_filename, table_done_callback=dpt_update2, table_error_callback=dpt_error2)
-            self.upload_sqlite_content(self.review_catalog, self.portal_prep_sqlite_filename, table_done_callback=dpt_update2, table_error_callback=dpt_error2)
+            if catalog_future is not None:
+                self.review_catalog = catalog_future.result()
+                if not dp.get('review_ermrest_url'):
+                    # a brand new catalog, so any upload markers refer to a previous, purged catalog
+                    for phase in ['upload_raw', 'upload']:
+                        SqliteProgress(progress_conn, phase).clear()
+            try:
+                self.upload_sqlite_all_content(
+                    self.review_catalog,
+                    self.ingest_sqlite_filename,
+                    self.portal_prep_sqlite_filename,
+                    table_done_callback=dpt_update2,
+                    table_error_callback=dpt_error2,
+                    raw_progress=SqliteProgress(progress_conn, 'upload_raw'),
+                    progress=SqliteProgress(progress_conn, 'upload'),
+                )
+            finally:
+                # record uploads which completed even if a later table failed
+                dpt_flush2()
 
             review_browse_url = '%s/chaise/recordset/#%s/CFDE:file' % (
                 self.review_catalog._base_server_uri,
@@ -453,6 +691,10 @@ class Submission (object):
             failed, failed_exc = True, e
             raise
         finally:
+            # let any abandoned background step finish before reporting status
+            background.shutdown(wait=True)
+            # markers are committed as they are stored
+            progress_conn.close()
             # record whatever we've discovered above
             if failed:
                 status, diagnostics = next_error_state, diagnostics
@@ -482,7 +724,7 @@ class Submission (object):
 
     ## mapping of submission ID to local processing resource names
     
-    @property
+    @functools.cached_property
     def download_filename(self):
         """Return download_filename target name for given submission id.
 
@@ -494,7 +736,7 @@ class Submission (object):
         # naive mapping should be OK for UUIDs...
         return '%s/downloads/%s' % (self.content_path_root, self.datapackage_id)
 
-    @property
+    @functools.cached_property
     def content_path(self):
         """Return content_path working state path for a given submssion id.
 
@@ -506,7 +748,17 @@ class Submission (object):
         # naive mapping should be OK for UUIDs...
         return '%s/unpacked/%s' % (self.content_path_root, self.datapackage_id)
 
-    @property
+    @functools.cached_property
+    def bag_fingerprint_filename(self):
+        """Return bag_fingerprint_filename validation memo name for given submission id.
+
+        This records the bag_fingerprint() of content_path after it
+        passed BDBag validation, surviving rebuild() purges of other
+        local state.
+        """
+        return '%s.bag_valid' % (self.content_path,)
+
+    @functools.cached_property
     def ingest_sqlite_filename(self):
         """Return ingest_sqlite_filename scratch C2M2 DB target name for given submssion id.
 
@@ -518,7 +770,7 @@ class Submission (object):
         # naive mapping should be OK for UUIDs...
         return '%s/databases/%s_submission.sqlite3' % (self.content_path_root, self.datapackage_id)
 
-    @property
+    @functools.cached_property
     def portal_prep_sqlite_filename(self):
         """Return portal_prep_sqlite_filename scratch C2M2 DB target name for given submssion id.
 
@@ -530,9 +782,19 @@ class Submission (object):
         # naive mapping should be OK for UUIDs...
         return '%s/databases/%s_portal_prep.sqlite3' % (self.content_path_root, self.datapackage_id)
 
+    @functools.cached_property
+    def progress_sqlite_filename(self):
+        """Return progress_sqlite_filename restart marker DB name for given submission id.
+
+        We use a deterministic mapping of submission id to
+        progress_sqlite_filename so that we can do reentrant processing.
+
+        """
+        return '%s/databases/%s_progress.sqlite3' % (self.content_path_root, self.datapackage_id)
+
     ## utility functions to help with various processing and validation tasks
 
-    @property
+    @functools.cached_property
     def restart_marker_filename(self):
         """Return restart_marker JSON file name for given submission id.
         """
@@ -599,6 +861,104 @@ class Submission (object):
         else:
             logger.debug('report_external_ops_error: No change needed on submission id=%(id)s status="%(status)s" diagnostics="%(diagnostics)s"' % dp)
 
+    _archive_session = None
+    _archive_session_lock = threading.Lock()
+
+    # (connect, read) timeouts in seconds for archive retrieval
+    archive_timeout = (10, 300)
+
+    @classmethod
+    def archive_session(cls):
+        """Return the requests session shared by all archive retrievals.
+
+        Keep-alive connections are pooled across submissions, so a
+        batch of ingests from the same archive host does not repeat
+        DNS and TLS setup for each download. Transient connection
+        failures and gateway errors are retried with backoff before
+        any response content is consumed.
+        """
+        with cls._archive_session_lock:
+            if Submission._archive_session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=16,
+                    pool_maxsize=32,
+                    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                Submission._archive_session = session
+            return Submission._archive_session
+
+    @classmethod
+    def compile_archive_headers_map(cls, archive_headers_map):
+        """Return list of (compiled_regexp, headers) rules for archive_headers_map.
+
+        The result can be passed anywhere an archive_headers_map is
+        accepted, to avoid re-parsing the patterns for each request.
+        """
+        if archive_headers_map is None:
+            return []
+        return [ (re.compile(pat), hdrs) for pat, hdrs in archive_headers_map.items() ]
+
+    @classmethod
+    def archive_request_headers(cls, archive_url, archive_headers_map):
+        """Return dict of HTTP request headers to use when retrieving archive_url.
+
+        :param archive_url: The URL to retrieve.
+        :param archive_headers_map: The archive_headers_map dict or its compile_archive_headers_map() rules.
+        """
+        if archive_headers_map is None or hasattr(archive_headers_map, 'items'):
+            archive_headers_map = cls.compile_archive_headers_map(archive_headers_map)
+        headers = dict()
+        for pat, hdrs in archive_headers_map:
+            if pat.fullmatch(archive_url):
+                headers.update(hdrs)
+        return headers
+
+    @classmethod
+    def retrieve_and_unpack_datapackage(cls, archive_url, download_filename, content_path, archive_headers_map):
+        """Idempotently stage datapackage content from archive_url into content_path.
+
+        Equivalent to retrieve_datapackage() followed by
+        unpack_datapackage(), but a tar archive is unpacked directly
+        from the HTTP response stream, never writing download_filename.
+
+        Zip archives need random access, so they are still staged
+        into download_filename before unpacking.
+        """
+        if os.path.isdir(content_path):
+            return
+        make_parent_dirs(download_filename, content_path)
+        if not os.path.isfile(download_filename) and not os.path.isfile(download_filename + '.downloading'):
+            headers = cls.archive_request_headers(archive_url, archive_headers_map)
+            logger.debug('Requesting %s for streaming unpack' % (archive_url,))
+            with cls.archive_session().get(archive_url, headers=headers, stream=True, timeout=cls.archive_timeout) as r:
+                r.raise_for_status()
+                # honor any Content-Encoding like iter_content() would
+                r.raw.decode_content = True
+                # keep buffered bytes readable after urllib3 hits the end of a small response
+                r.raw.auto_close = False
+                stream = io.BufferedReader(r.raw, buffer_size=1024*1024)
+                head = stream.peek(512)[:512]
+                # gzip, bzip2, xz, zstd, or plain tar magic
+                if head.startswith((b'\x1f\x8b', b'BZh', b'\xfd7zXZ\x00', cls.zstd_magic)) or head[257:262] == b'ustar':
+                    cls.unpack_datapackage(download_filename, content_path, stream=stream)
+                    return
+                # stage the rest of this response like retrieve_datapackage() instead of requesting it again
+                tmp_name = download_filename + '.downloading'
+                logger.debug('Archive %s is not a recognized tar stream, staging download "%s" before unpack' % (archive_url, tmp_name))
+                cls.save_download_validator(r, tmp_name + '.validator')
+                with open(tmp_name, 'wb', buffering=cls.download_buffer_size) as f:
+                    # the buffered reader still holds the sniffed head
+                    shutil.copyfileobj(stream, f, 1024*1024)
+            os.rename(tmp_name, download_filename)
+            logger.info('Renamed download "%s" to final "%s"' % (tmp_name, download_filename))
+            if os.path.isfile(tmp_name + '.validator'):
+                os.remove(tmp_name + '.validator')
+        cls.retrieve_datapackage(archive_url, download_filename, archive_headers_map)
+        cls.unpack_datapackage(download_filename, content_path)
+
     @classmethod
     def retrieve_datapackage(cls, archive_url, download_filename, archive_headers_map):
         """Idempotently stage datapackage content from archive_url into download_filename.
@@ -606,58 +966,196 @@ class Submission (object):
         Uses a temporary download name and renames after successful
         download, so we can assume a file present at this name is
         already downloaded.
+
+        A partial download left behind by an interrupted attempt is
+        resumed with an HTTP Range request, if the server offered a
+        strong validator (ETag or Last-Modified) for it. The validator
+        is kept in a sidecar file and sent as If-Range, so a changed
+        archive is downloaded from scratch instead.
+
+        A fresh download of a large archive is first attempted as
+        concurrent byte ranges. See retrieve_datapackage_ranges().
         """
         if os.path.isfile(download_filename):
             return
+        make_parent_dirs(download_filename)
 
-        headers = dict()
-        if archive_headers_map is not None:
-            for pat, hdrs in archive_headers_map.items():
-                if re.fullmatch(pat, archive_url):
-                    headers.update(hdrs)
+        headers = cls.archive_request_headers(archive_url, archive_headers_map)
+        tmp_name = download_filename + '.downloading'
+        validator_name = tmp_name + '.validator'
 
-        fd, tmp_name  = None, None
-        try:
-            # use a temporary download file in same dir
-            fd, tmp_name = tempfile.mkstemp(
-                suffix='.downloading',
-                prefix=os.path.basename(download_filename) + '_',
-                dir=os.path.dirname(download_filename),
-                text=False,
-            )
-            logger.debug('Downloading %s to temporary download file "%s"' % (
-                archive_url,
-                tmp_name,
-            ))
+        if not os.path.isfile(tmp_name) \
+           and cls.retrieve_datapackage_ranges(archive_url, download_filename, headers):
+            return
 
-            r = requests.get(archive_url, headers=headers, stream=True)
+        offset = 0
+        if os.path.isfile(tmp_name) and os.path.isfile(validator_name):
+            with open(validator_name) as f:
+                validator = f.read().strip()
+            offset = os.path.getsize(tmp_name)
+            if offset > 0 and validator:
+                headers['Range'] = 'bytes=%d-' % offset
+                headers['If-Range'] = validator
+            else:
+                offset = 0
+
+        logger.debug('Downloading %s to temporary download file "%s"%s' % (
+            archive_url,
+            tmp_name,
+            ' resuming at offset %d' % offset if offset else '',
+        ))
+        with cls.archive_session().get(archive_url, headers=headers, stream=True, timeout=cls.archive_timeout) as r:
+            if r.status_code == 416 and offset:
+                # our partial file does not fit the remote content
+                logger.info('Discarding unresumable partial download "%s"' % (tmp_name,))
+                os.remove(validator_name)
+                os.remove(tmp_name)
+                return cls.retrieve_datapackage(archive_url, download_filename, archive_headers_map)
             r.raise_for_status()
-            for chunk in r.iter_content(chunk_size=128*1024):
-                os.write(fd, chunk)
-            os.close(fd)
-            logger.debug('Finished downloading to "%s"' % (tmp_name,))
-            fd = None
+            if offset and r.status_code == 206 \
+               and r.headers.get('Content-Range', '').startswith('bytes %d-' % offset):
+                mode = 'ab'
+            else:
+                # a full response, e.g. If-Range found the archive changed
+                mode, offset = 'wb', 0
+                cls.save_download_validator(r, validator_name)
+            # honor any Content-Encoding like iter_content() would
+            r.raw.decode_content = True
+            with open(tmp_name, mode, buffering=cls.download_buffer_size) as f:
+                shutil.copyfileobj(r.raw, f, 1024*1024)
+        logger.debug('Finished downloading to "%s"' % (tmp_name,))
+
+        # rename completed download to canonical name
+        os.rename(tmp_name, download_filename)
+        logger.info('Renamed download "%s" to final "%s"' % (tmp_name, download_filename))
+        if os.path.isfile(validator_name):
+            os.remove(validator_name)
 
-            # rename completed download to canonical name
-            os.rename(tmp_name, download_filename)
-            logger.info('Renamed download "%s" to final "%s"' % (tmp_name, download_filename))
-            tmp_name = None
+    @classmethod
+    def save_download_validator(cls, r, validator_name):
+        """Keep the strong validator of full archive response r, so a partial download can be resumed."""
+        validator = r.headers.get('ETag', '')
+        if not validator or validator.startswith('W/'):
+            validator = r.headers.get('Last-Modified', '')
+        if validator and r.headers.get('Content-Encoding', 'identity') == 'identity':
+            with open(validator_name, 'w') as f:
+                f.write(validator)
+        elif os.path.isfile(validator_name):
+            # byte ranges would not line up with decoded content
+            os.remove(validator_name)
+
+    @classmethod
+    def retrieve_datapackage_ranges(cls, archive_url, download_filename, headers):
+        """Try to download archive_url into download_filename as concurrent byte ranges.
+
+        :param archive_url: The archive URL to download.
+        :param download_filename: The final download filename to produce.
+        :param headers: The request headers for archive_url.
+
+        Some archive hosts throttle each connection rather than each
+        client, so several ranged GETs can finish much sooner than
+        one. This is only attempted when a HEAD request reports byte
+        range support, an identity-encoded size of at least
+        download_ranges_min_bytes, and a strong validator to send as
+        If-Range, so every range comes from the same archive version.
+
+        Set CFDE_DOWNLOAD_RANGES to the number of concurrent ranges
+        (default 8) or to 1 to disable.
+
+        Returns True if download_filename was produced, or False if
+        the caller should download the archive as one stream instead.
+        Ranges are written into a separate temporary file, which is
+        discarded on failure, so they are never mistaken for a
+        resumable single-stream partial download.
+        """
+        num_ranges = int(os.getenv('CFDE_DOWNLOAD_RANGES', '8'))
+        if num_ranges <= 1:
+            return False
+
+        session = cls.archive_session()
+        try:
+            with session.head(archive_url, headers=headers, allow_redirects=True, timeout=cls.archive_timeout) as r:
+                if r.status_code != 200 \
+                   or r.headers.get('Accept-Ranges', '').lower() != 'bytes' \
+                   or r.headers.get('Content-Encoding', 'identity') != 'identity':
+                    return False
+                size = int(r.headers.get('Content-Length', '0'))
+                validator = r.headers.get('ETag', '')
+                if not validator or validator.startswith('W/'):
+                    validator = r.headers.get('Last-Modified', '')
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.debug('Could not probe %s for ranged download: %s' % (archive_url, e))
+            return False
+        if size < cls.download_ranges_min_bytes or not validator:
+            return False
+
+        tmp_name = download_filename + '.ranges'
+        range_size = -(-size // num_ranges)
+
+        def fetch_range(fd, start, end):
+            range_headers = dict(headers)
+            range_headers.update({
+                'Range': 'bytes=%d-%d' % (start, end - 1),
+                'If-Range': validator,
+            })
+            with session.get(archive_url, headers=range_headers, stream=True, timeout=cls.archive_timeout) as r:
+                r.raise_for_status()
+                if r.status_code != 206 \
+                   or not r.headers.get('Content-Range', '').startswith('bytes %d-%d/' % (start, end - 1)):
+                    # server ignored the range or the archive changed
+                    return False
+                pos = start
+                while pos < end:
+                    buf = r.raw.read(min(1024*1024, end - pos))
+                    if not buf:
+                        return False
+                    view = memoryview(buf)
+                    while view:
+                        nbytes = os.pwrite(fd, view, pos)
+                        view = view[nbytes:]
+                        pos += nbytes
+                return True
+
+        logger.debug('Downloading %s to temporary download file "%s" as %d ranges' % (archive_url, tmp_name, num_ranges))
+        completed = False
+        fd = os.open(tmp_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            os.ftruncate(fd, size)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=num_ranges) as pool:
+                futures = [
+                    pool.submit(fetch_range, fd, start, min(start + range_size, size))
+                    for start in range(0, size, range_size)
+                ]
+                completed = all([ future.result() for future in futures ])
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, OSError) as e:
+            # raw body reads raise urllib3 errors, e.g. ProtocolError, and writes may raise OSError
+            logger.info('Ranged download of %s failed, retrying as one stream: %s' % (archive_url, e))
         finally:
-            if fd is not None:
-                os.close(fd)
-            if tmp_name is not None:
+            os.close(fd)
+            if not completed:
                 os.remove(tmp_name)
+        if not completed:
+            return False
+
+        os.rename(tmp_name, download_filename)
+        logger.info('Renamed download "%s" to final "%s"' % (tmp_name, download_filename))
+        return True
 
     @classmethod
-    def unpack_datapackage(cls, download_filename, content_path):
+    def unpack_datapackage(cls, download_filename, content_path, stream=None):
         """Idempotently unpack download_filename (a BDBag) into content_path (bag contents dir).
 
+        :param download_filename: The archive file to unpack.
+        :param content_path: The bag contents dir to produce.
+        :param stream: Optional binary stream of a tar archive to unpack instead of download_filename.
+
         Uses a temporary unpack name and renames after successful
         unpack, so we can assume a contents dir already present at
         this name is already completely unpacked.
         """
         if os.path.isdir(content_path):
             return
+        make_parent_dirs(content_path)
 
         tmp_name = None
         try:
@@ -668,7 +1166,7 @@ class Submission (object):
                 dir=os.path.dirname(content_path),
             )
             logger.debug('Extracting "%s" in temporary unpack dir "%s"' % (
-                download_filename,
+                download_filename if stream is None else 'stream',
                 tmp_name,
             ))
             abs_tmp_name = os.path.realpath(tmp_name)
@@ -695,10 +1193,14 @@ class Submission (object):
                 prefix = os.path.commonprefix([abs_tmp_name, abs_target])
                 return prefix == abs_tmp_name
 
-            if zipfile.is_zipfile(download_filename):
-                with open(download_filename, 'rb') as bag_file:
+            if stream is not None:
+                is_tar = True
+            elif zipfile.is_zipfile(download_filename):
+                is_tar = False
+                with cls.open_archive(download_filename) as bag_file:
                     with zipfile.ZipFile(bag_file) as decoder:
-                        for member in decoder.infolist():
+                        members = decoder.infolist()
+                        for member in members:
                             # this check may be redundant if zipfile is stripping '..' and leading '/'
                             #
                             # TODO: revisit if zipfile module starts supporting more than file+dir types
@@ -707,36 +1209,46 @@ class Submission (object):
                                 raise exception.InvalidDatapackage(
                                     "Zipfile member %r not allowed" % (member.filename)
                                 )
-                        #
-                        decoder.extractall(abs_tmp_name)
-            elif tarfile.is_tarfile(download_filename):
-                with tarfile.open(download_filename) as decoder:
-                    def has_allowed_type(member):
-                        return member.isfile() or member.isdir()
-
-                    for member in decoder.getmembers():
-                        # to maintain our safety assumptions, we should never extract links
-                        # and other special file types are not appropriate for datapackages either...
-                        if not (has_allowed_type(member)
-                                and is_allowed_path(member.name)):
-                            member_type = {
-                                tarfile.LNKTYPE: 'link',
-                                tarfile.SYMTYPE: 'symlink',
-                                tarfile.FIFOTYPE: 'fifo special',
-                                tarfile.CHRTYPE: 'char special',
-                                tarfile.BLKTYPE: 'block special',
-                            }.get(member.type, member.type)
-                            raise exception.InvalidDatapackage(
-                                "Tarfile member %r (type %r) not allowed" % (member.name, member_type)
-                            )
                     #
-                    decoder.extractall(abs_tmp_name)
+                    cls.extract_zip_members(download_filename, members, abs_tmp_name)
+            elif tarfile.is_tarfile(download_filename) or cls.is_zstd_file(download_filename):
+                is_tar = True
             else:
                 raise exception.InvalidDatapackage('Unknown or unsupported bag archive format')
 
+            if is_tar:
+                # stream mode decompresses the archive once, checking and extracting each member in turn,
+                # instead of a getmembers() scan followed by a second decompression pass in extractall()
+                with cls.open_tar_stream(download_filename, stream=stream) as decoder:
+                    def has_allowed_type(member):
+                        return member.isfile() or member.isdir()
+
+                    def checked_members():
+                        for member in decoder:
+                            # to maintain our safety assumptions, we should never extract links
+                            # and other special file types are not appropriate for datapackages either...
+                            if not (has_allowed_type(member)
+                                    and is_allowed_path(member.name)):
+                                member_type = {
+                                    tarfile.LNKTYPE: 'link',
+                                    tarfile.SYMTYPE: 'symlink',
+                                    tarfile.FIFOTYPE: 'fifo special',
+                                    tarfile.CHRTYPE: 'char special',
+                                    tarfile.BLKTYPE: 'block special',
+                                }.get(member.type, member.type)
+                                raise exception.InvalidDatapackage(
+                                    "Tarfile member %r (type %r) not allowed" % (member.name, member_type)
+                                )
+                            yield member
+
+                    # partial output is discarded with tmp_name if a later member is rejected
+                    cls.extract_tar_members(decoder, checked_members(), abs_tmp_name)
+
             logger.debug('Finished extracting to "%s"' % (tmp_name,))
 
-            children = glob('%s/*' % tmp_name)
+            # like glob('%s/*') but without pattern matching, still ignoring dotfiles
+            with os.scandir(tmp_name) as entries:
+                children = [ entry.path for entry in entries if not entry.name.startswith('.') ]
             if len(children) < 1:
                 raise exception.InvalidDatapackage('Did not find expected top-level folder in bag archive')
             elif len(children) > 1:
@@ -749,29 +1261,436 @@ class Submission (object):
                 shutil.rmtree(tmp_name)
 
     @classmethod
-    def bdbag_validate(cls, content_path):
-        """Perform BDBag validation of unpacked bag contents."""
+    def extract_tar_members(cls, decoder, members, dest_dir):
+        """Extract already-checked members of a streaming tarfile into dest_dir.
+
+        :param decoder: The streaming (mode 'r|') TarFile being read.
+        :param members: Iterable of the decoder's TarInfo members in archive order, with safe names and types.
+        :param dest_dir: The (absolute) directory to extract into.
+
+        The archive is decompressed once, in order, by the calling
+        thread. Files up to unpack_tar_buffer_max_bytes are read into
+        memory and written out by worker threads, so their
+        open/write/close syscalls overlap further decompression, with
+        at most unpack_tar_buffered_files pending at once. Larger
+        files are copied by the calling thread through one reused
+        1 MiB buffer. Set CFDE_UNPACK_WORKERS=1 to write every file
+        from the calling thread.
+
+        Only the member mtime is applied, as ownership and permission
+        bits do not matter for bag content.
+        """
+        max_workers = max(int(os.getenv('CFDE_UNPACK_WORKERS', '4')), 1)
+        buf = memoryview(bytearray(1024*1024))
+        pending = threading.BoundedSemaphore(cls.unpack_tar_buffered_files)
+        futures = []
+        written = set()
+        # each output dir is created once, by this thread, before any file in it
+        dirnames = {dest_dir}
+        def ensure_dir(dirname):
+            if dirname not in dirnames:
+                os.makedirs(dirname, exist_ok=True)
+                dirnames.add(dirname)
+
+        def write_buffered(target, data, mtime):
+            try:
+                with open(target, 'wb') as dst:
+                    dst.write(data)
+                os.utime(target, (mtime, mtime))
+            finally:
+                pending.release()
+
+        def copy_member(member, target):
+            with decoder.extractfile(member) as src:
+                with open(target, 'wb') as dst:
+                    while True:
+                        nbytes = src.readinto(buf)
+                        if not nbytes:
+                            break
+                        dst.write(buf[:nbytes])
+            os.utime(target, (member.mtime, member.mtime))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for member in members:
+                target = os.path.normpath(os.path.join(dest_dir, member.name))
+                if member.isdir():
+                    ensure_dir(target)
+                    continue
+                ensure_dir(os.path.dirname(target))
+                if target in written:
+                    # a repeated member name must still overwrite in archive order
+                    for future in futures:
+                        future.result()
+                written.add(target)
+                if max_workers > 1 and member.size <= cls.unpack_tar_buffer_max_bytes:
+                    with decoder.extractfile(member) as src:
+                        data = src.read()
+                    pending.acquire()
+                    futures.append(pool.submit(write_buffered, target, data, member.mtime))
+                else:
+                    copy_member(member, target)
+            for future in futures:
+                # propagate first error, e.g. a full disk
+                future.result()
+
+    @classmethod
+    def extract_zip_members(cls, download_filename, members, dest_dir):
+        """Extract already-checked zipfile members into dest_dir using worker threads.
+
+        :param download_filename: The zipfile to read.
+        :param members: The list of ZipInfo members to extract, with safe names.
+        :param dest_dir: The (absolute) directory to extract into.
+
+        Each worker thread reads through its own ZipFile handle, so
+        member decompression and file writes proceed in parallel.
+        Set CFDE_UNPACK_WORKERS=1 to extract sequentially, which is
+        also done for archives smaller than unpack_parallel_min_bytes.
+
+        Workers read the archive through memory maps, and stored
+        (uncompressed) members are copied in-kernel where possible,
+        see copy_stored_zip_member().
+        """
+        max_workers = max(int(os.getenv('CFDE_UNPACK_WORKERS', '4')), 1)
+        files = [ member for member in members if not member.is_dir() ]
+        if len(files) < 2 or sum([ member.file_size for member in files ]) < cls.unpack_parallel_min_bytes:
+            max_workers = 1
+
+        # create all dirs up front so workers never race on makedirs
+        dirnames = set()
+        for member in members:
+            target = os.path.join(dest_dir, member.filename)
+            dirnames.add(target if member.is_dir() else os.path.dirname(target))
+        for dirname in sorted(dirnames):
+            os.makedirs(dirname, exist_ok=True)
+
+        local = threading.local()
+        decoders = []
+        def extract(member):
+            decoder = getattr(local, 'decoder', None)
+            if decoder is None:
+                # a private map per thread, since a map has one shared seek position
+                mm = _MappedFile(archive.fileno(), 0, access=mmap.ACCESS_READ)
+                decoders.append(mm)
+                decoder = local.decoder = zipfile.ZipFile(mm)
+                decoders.append(decoder)
+            with open(os.path.join(dest_dir, member.filename), 'wb') as dst:
+                if cls.copy_stored_zip_member(archive.fileno(), member, dst.fileno()):
+                    return
+                with decoder.open(member) as src:
+                    shutil.copyfileobj(src, dst, 1024*1024)
+
+        # member header seeks and reads become page-cache hits instead of syscalls
+        archive = open(download_filename, 'rb')
+        try:
+            if max_workers == 1:
+                for member in files:
+                    extract(member)
+            else:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    for future in [ pool.submit(extract, member) for member in files ]:
+                        # propagate first error, e.g. a corrupt member
+                        future.result()
+        finally:
+            # each ZipFile is closed before its map
+            for decoder in reversed(decoders):
+                decoder.close()
+            archive.close()
+
+    @classmethod
+    def copy_stored_zip_member(cls, src_fd, member, dst_fd):
+        """Copy an uncompressed zipfile member's content without passing it through userspace.
+
+        :param src_fd: File descriptor of the zipfile.
+        :param member: The ZipInfo of the member to copy.
+        :param dst_fd: File descriptor of the empty output file.
+
+        Returns False without copying anything if the member is not a
+        plain stored member or in-kernel copies are unsupported here,
+        in which case the caller should extract the usual way.
+
+        The zip CRC is not checked on this path, as the bag manifest
+        checksums are verified after unpacking anyway.
+        """
+        if member.compress_type != zipfile.ZIP_STORED or member.flag_bits & 0x1:
+            return False
+        if not hasattr(os, 'copy_file_range') and not hasattr(os, 'sendfile'):
+            return False
+        # member content follows its variable-length local file header
+        fheader = os.pread(src_fd, zipfile.sizeFileHeader, member.header_offset)
+        if len(fheader) != zipfile.sizeFileHeader:
+            raise zipfile.BadZipFile('Truncated file header for member %r' % (member.filename,))
+        fheader = struct.unpack(zipfile.structFileHeader, fheader)
+        if fheader[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile('Bad magic number for file header of member %r' % (member.filename,))
+        offset = member.header_offset + zipfile.sizeFileHeader \
+            + fheader[zipfile._FH_FILENAME_LENGTH] + fheader[zipfile._FH_EXTRA_FIELD_LENGTH]
+
+        remaining = member.file_size
+        use_copy_file_range = hasattr(os, 'copy_file_range')
+        while remaining > 0:
+            try:
+                if use_copy_file_range:
+                    nbytes = os.copy_file_range(src_fd, dst_fd, remaining, offset)
+                else:
+                    nbytes = os.sendfile(dst_fd, src_fd, offset, remaining)
+            except OSError as e:
+                if e.errno not in {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP}:
+                    raise
+                if use_copy_file_range:
+                    # e.g. cross-filesystem on older kernels
+                    use_copy_file_range = False
+                    continue
+                if remaining == member.file_size:
+                    return False
+                raise
+            if nbytes == 0:
+                raise zipfile.BadZipFile('Truncated content for member %r' % (member.filename,))
+            offset += nbytes
+            remaining -= nbytes
+        return True
+
+    @classmethod
+    @contextlib.contextmanager
+    def open_archive(cls, download_filename):
+        """Context manager yielding download_filename opened for one sequential binary read.
+
+        Where supported, advises the kernel to read ahead aggressively
+        and to drop the archive from the page cache when done, since
+        we never read it again and would rather keep cache for the
+        unpacked content and sqlite databases.
+        """
+        with open(download_filename, 'rb', buffering=1024*1024) as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            try:
+                yield f
+            finally:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+    # zstandard frame magic, for .tar.zst bags which tarfile cannot sniff
+    zstd_magic = b'\x28\xb5\x2f\xfd'
+
+    # multi-threaded decompression tools to try, by compressed stream magic
+    external_decompressors = [
+        (b'BZh', ['lbzip2', 'pbzip2']),
+        (b'\x1f\x8b', ['pigz']),
+        (zstd_magic, ['zstd']),
+    ]
+
+    @classmethod
+    def is_zstd_file(cls, filename):
+        """Return True if filename starts with a zstandard frame."""
+        with open(filename, 'rb') as f:
+            return f.read(len(cls.zstd_magic)) == cls.zstd_magic
+
+    @classmethod
+    def external_decompressor(cls, head):
+        """Return command argv to decompress a stream starting with head bytes, or None.
+
+        Only tools found on PATH are considered. Set
+        CFDE_EXTERNAL_DECOMPRESS=false to always decompress in-process.
+        A gzip stream is left to ISA-L when the optional isal package
+        is available, since it outperforms pigz (which cannot
+        parallelize inflate).
+        """
+        if os.getenv('CFDE_EXTERNAL_DECOMPRESS', 'true').lower() != 'true':
+            return None
+        for magic, tools in cls.external_decompressors:
+            if not head.startswith(magic):
+                continue
+            if magic == b'\x1f\x8b' and igzip is not None:
+                return None
+            for tool in tools:
+                path = shutil.which(tool)
+                if path is not None:
+                    return [path, '-d', '-c']
+        return None
+
+    @classmethod
+    @contextlib.contextmanager
+    def external_decompress(cls, f, argv):
+        """Context manager yielding decompressed content of binary stream f via argv subprocess.
+
+        A feeder thread copies f into the tool's stdin while the
+        caller reads its stdout. Raises InvalidDatapackage if the tool
+        reports failure.
+        """
+        proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        def feed():
+            try:
+                shutil.copyfileobj(f, proc.stdin, 1024*1024)
+                proc.stdin.close()
+            except BrokenPipeError:
+                # tool exited early, its status tells the story
+                pass
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        completed = False
+        try:
+            yield proc.stdout
+            # drain trailing padding the tar reader did not need
+            while proc.stdout.read(1024*1024):
+                pass
+            completed = True
+        finally:
+            if not completed:
+                proc.kill()
+            proc.stdout.close()
+            returncode = proc.wait()
+            feeder.join()
+        if returncode != 0:
+            raise exception.InvalidDatapackage('Bag archive decompression with %s failed with status %s' % (os.path.basename(argv[0]), returncode))
+
+    @classmethod
+    @contextlib.contextmanager
+    def open_tar_stream(cls, download_filename, stream=None):
+        """Context manager yielding download_filename as a streaming tarfile reader.
+
+        :param download_filename: The archive file to read.
+        :param stream: Optional peekable binary stream (e.g. io.BufferedReader) to read instead of download_filename.
+
+        Gzip-compressed archives are decompressed with ISA-L when the
+        optional isal package is available, which is substantially
+        faster than the stdlib zlib binding for large bags.
+
+        Otherwise, bzip2 or gzip archives are decompressed by a
+        multi-threaded external tool (lbzip2, pbzip2, or pigz) when
+        one is installed. See external_decompressor().
+
+        Zstandard-compressed (.tar.zst) archives, which tarfile does
+        not support, are decompressed by the zstd tool or else the
+        optional zstandard package.
+
+        The decoder reads its input and copies member content in 1 MiB
+        chunks rather than the tarfile defaults of 10 KiB and 16 KiB.
+        """
+        bufsize = 1024*1024
+        if stream is None:
+            opener = cls.open_archive(download_filename)
+        else:
+            opener = contextlib.nullcontext(stream)
+        with opener as f:
+            argv = cls.external_decompressor(f.peek(4)[:4])
+            if argv is not None:
+                logger.debug('Decompressing bag archive with %s' % (argv[0],))
+                with cls.external_decompress(f, argv) as plain:
+                    with tarfile.open(fileobj=plain, mode='r|', bufsize=bufsize, copybufsize=bufsize) as decoder:
+                        yield decoder
+                return
+            if igzip is not None:
+                is_gzip = f.peek(2)[:2] == b'\x1f\x8b'
+                if is_gzip:
+                    with igzip.open(f, 'rb') as gz:
+                        with tarfile.open(fileobj=gz, mode='r|', bufsize=bufsize, copybufsize=bufsize) as decoder:
+                            yield decoder
+                    return
+            if f.peek(4)[:4] == cls.zstd_magic:
+                if zstandard is None:
+                    raise exception.InvalidDatapackage('Bag archive is zstd-compressed, but neither the zstd tool nor the zstandard package is available')
+                with zstandard.ZstdDecompressor().stream_reader(f, read_size=bufsize) as zs:
+                    with tarfile.open(fileobj=zs, mode='r|', bufsize=bufsize, copybufsize=bufsize) as decoder:
+                        yield decoder
+                return
+            try:
+                decoder = tarfile.open(fileobj=f, mode='r|*', bufsize=bufsize, copybufsize=bufsize)
+            except tarfile.ReadError as e:
+                # a streamed archive was not sniffed by tarfile.is_tarfile()
+                raise exception.InvalidDatapackage('Unknown or unsupported bag archive format: %s' % (e,))
+            with decoder:
+                yield decoder
+
+    @classmethod
+    def bdbag_validate(cls, content_path, fingerprint_filename=None):
+        """Perform BDBag validation of unpacked bag contents.
+
+        :param content_path: The unpacked bag contents dir.
+        :param fingerprint_filename: Optional memo file to skip re-validation of an unchanged bag.
+
+        Manifest checksums are verified by a pool of hashing threads,
+        sized by the CFDE_BDBAG_PROCESSES environment variable
+        (default: number of CPUs). Set it to 1 to hash sequentially.
+
+        With fingerprint_filename, the bag_fingerprint() of a valid
+        bag is stored there, and validation is skipped later if the
+        fingerprint still matches.
+        """
         if os.getenv('CFDE_SKIP_BDBAG', 'false').lower() == 'true':
             logger.info('SKIPPING validation of bag "%s" due to CFDE_SKIP_BDBAG environment variable!' % content_path)
             return
+        if fingerprint_filename is not None:
+            fingerprint = cls.bag_fingerprint(content_path)
+            try:
+                with open(fingerprint_filename) as f:
+                    if f.read() == fingerprint:
+                        logger.info('Bag at %s unchanged since last successful validation' % content_path)
+                        return
+            except FileNotFoundError:
+                pass
+        processes = int(os.getenv('CFDE_BDBAG_PROCESSES', '0')) or os.cpu_count() or 1
         try:
-            logger.debug('Validating unpacked bag at "%s"' % (content_path,))
-            bdbag_api.validate_bag(content_path)
+            logger.debug('Validating unpacked bag at "%s" using %d processes' % (content_path, processes))
+            # same as bdbag_api.validate_bag() but without needing a bdbag config file to set processes
+            FastBDBag(content_path).validate(processes)
             logger.info('Bag valid at %s' % content_path)
         except (BagError, BagValidationError) as e:
             logger.error('Validation failed for bag "%s" with error "%s"' % (content_path, e,))
             raise exception.InvalidDatapackage(e)
+        if fingerprint_filename is not None:
+            with open(fingerprint_filename + '.tmp', 'w') as f:
+                f.write(fingerprint)
+            os.replace(fingerprint_filename + '.tmp', fingerprint_filename)
+
+    @classmethod
+    def bag_fingerprint(cls, content_path):
+        """Return a cheap fingerprint of unpacked bag contents.
+
+        Covers the name, size, and mtime of every file and the full
+        content of the (small) manifest files, without reading the
+        payload files themselves.
+        """
+        h = hashlib.blake2b(digest_size=32)
+        for dirpath, dirnames, filenames in os.walk(content_path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                st = os.stat(path)
+                h.update(('%s\0%d\0%d\n' % (os.path.relpath(path, content_path), st.st_size, st.st_mtime_ns)).encode('utf-8'))
+                if dirpath == content_path and filename.startswith(('manifest-', 'tagmanifest-')):
+                    with open(path, 'rb') as f:
+                        h.update(f.read())
+        return h.hexdigest()
 
     @classmethod
     def datapackage_name_from_path(cls, content_path):
-        """Find datapackage name by globbing ./data/*.json under content_path."""
-        candidates = glob('%s/data/*.json' % content_path)
+        """Find datapackage name by listing ./data/*.json under content_path."""
+        try:
+            with os.scandir('%s/data' % content_path) as entries:
+                candidates = [
+                    entry.path
+                    for entry in entries
+                    if entry.name.endswith('.json') and not entry.name.startswith('.')
+                    # d_type from the directory listing, so no per-entry stat
+                    and entry.is_file(follow_symlinks=False)
+                ]
+        except (FileNotFoundError, NotADirectoryError):
+            candidates = []
         if len(candidates) < 1:
             raise exception.FilenameError('Could not locate datapackage *.json file.')
         elif len(candidates) > 1:
             raise exception.FilenameError('Found too many (%d) potential datapackage *.json choices.' % (len(candidates),))
         return candidates[0]
 
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def canonical_datapackage(cls, schema_json):
+        """Return a shared CfdeDataPackage for a built-in schema, parsed once per process.
+
+        Callers MUST treat the result as read-only, i.e. not bind it
+        to a catalog or otherwise mutate it.
+        """
+        return CfdeDataPackage(schema_json)
+
     @classmethod
     def datapackage_model_check(cls, content_path, pre_process=None):
         """Perform datapackage model validation for submission content.
@@ -782,34 +1701,112 @@ class Submission (object):
         introduce any undesired deviations in the model definition.
 
         """
-        canon_dp = CfdeDataPackage(submission_schema_json)
+        canon_dp = cls.canonical_datapackage(submission_schema_json)
         packagefile = cls.datapackage_name_from_path(content_path)
         if pre_process:
             pre_process(content_path, packagefile)
-        submitted_dp = CfdeDataPackage(packagefile)
+        submitted_dp = CfdeDataPackage.from_file_cached(packagefile)
         canon_dp.validate_model_subset(submitted_dp)
 
     @classmethod
-    def datapackage_validate(cls, content_path, post_process=None, check_keys=True, check_fkeys=True):
+    def frictionless_validate_resources(cls, package, resource_callback, **options):
+        """Validate each package resource in its own worker process, streaming partial reports.
+
+        :param package: The frictionless.Package to validate without foreign key checks
+        :param resource_callback: Callback function with signature lambda report: ... for each resource
+        :param options: Resource validation options, e.g. limit_errors
+
+        Like frictionless's own parallel validation, but passes each
+        single-resource report to resource_callback as soon as it is
+        done instead of waiting on the slowest resource. The largest
+        resource files are started first, so one big table does not
+        trail behind the rest. Returns the combined report, in package
+        resource order so its first error matches serial validation.
+        """
+        def resource_size(resource):
+            try:
+                return os.path.getsize(os.path.join(resource.basepath, resource.path))
+            except (OSError, TypeError):
+                return 0
+
+        tasks = []
+        for resource in package.resources:
+            # match frictionless: only keep stats the submitter declared
+            resource.stats = { k: v for k, v in resource.stats.items() if v }
+            tasks.append(frictionless.InquiryTask(
+                source=resource,
+                basepath=resource.basepath,
+                original=True,
+                **options
+            ).to_dict())
+        sizes = [ resource_size(resource) for resource in package.resources ]
+
+        timer = datetime.datetime.now()
+        reports = [ None ] * len(tasks)
+        max_workers = min(len(tasks), os.cpu_count() or 1) or 1
+        # spawn rather than fork, since ingest has background threads running by now
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {
+                pool.submit(_frictionless_validate_task, tasks[i]): i
+                for i in sorted(range(len(tasks)), key=lambda i: sizes[i], reverse=True)
+            }
+            for future in concurrent.futures.as_completed(futures):
+                report = frictionless.Report(future.result())
+                resource_callback(report)
+                reports[futures[future]] = report
+
+        return frictionless.Report(
+            time=(datetime.datetime.now() - timer).total_seconds(),
+            errors=[ error for report in reports for error in report.errors ],
+            tasks=[ task for report in reports for task in report.tasks ],
+        )
+
+    @staticmethod
+    def frictionless_skipped():
+        """Return True if CFDE_SKIP_FRICTIONLESS disables datapackage_validate()."""
+        return os.getenv('CFDE_SKIP_FRICTIONLESS', 'false').lower() == 'true'
+
+    @classmethod
+    def datapackage_validate(cls, content_path, post_process=None, check_keys=True, check_fkeys=True, limit_errors=None):
         """Perform datapackage validation.
 
         :param content_path: The path to the submission
         :param post_process: Optional callback function with signature lambda content_path, packagefilename, report: ... (default None)
         :param check_keys: Whether to check primary key and uniqueness constraints (default True)
         :param check_fkeys: Whether to check foreign key reference constraints (default True)
+        :param limit_errors: Optional number of errors after which to stop checking each resource (default None uses frictionless default)
 
         This validation considers the TSV content of the datapackage
         to be sure it conforms to its own JSON datapackage
         specification.
+
+        Resources are validated in parallel worker processes when
+        check_fkeys=False, unless the CFDE_FRICTIONLESS_PARALLEL
+        environment variable is set to false. In that case,
+        post_process is called with a partial report as each resource
+        finishes, rather than once with the whole report.
         """
         packagefile = cls.datapackage_name_from_path(content_path)
-        if os.getenv('CFDE_SKIP_FRICTIONLESS', 'false').lower() == 'true':
+        if cls.frictionless_skipped():
             logger.info('SKIPPING validation of frictionless datapackage at "%s" due to CFDE_SKIP_FRICTIONLESS environment variable!' % packagefile)
             return
         logger.info('Validating frictionless datapackage at "%s"' % packagefile)
 
         package = frictionless.Package(packagefile, trusted=False)
+        # frictionless re-opens resources as trusted in parallel mode, so enforce path safety here
+        parallel = (
+            os.getenv('CFDE_FRICTIONLESS_PARALLEL', 'true').lower() == 'true'
+            # frictionless skips cross-resource fkey checks in parallel mode
+            and not check_fkeys
+            and len(package.resources) > 1
+            # let frictionless report broken package metadata
+            and not package.metadata_errors
+        )
         for resource in package.resources:
+            if parallel:
+                path = resource.get('path')
+                if not isinstance(path, str) or os.path.isabs(path) or '..' in path.split('/'):
+                    raise exception.InvalidDatapackage('Resource %r has unsafe path %r' % (resource.get('name'), path))
             if not check_fkeys:
                 resource.schema.pop('foreignKeys', None)
             if not check_keys:
@@ -828,9 +1825,19 @@ class Submission (object):
                 },
             )
 
-        report = frictionless.package.validate.validate(package, original=True, parallel=False)
-        if post_process:
-            post_process(content_path, packagefile, report)
+        options = {}
+        if limit_errors is not None:
+            options['limit_errors'] = limit_errors
+        if parallel:
+            report = cls.frictionless_validate_resources(
+                package,
+                lambda report: post_process(content_path, packagefile, report) if post_process else None,
+                **options
+            )
+        else:
+            report = frictionless.package.validate.validate(package, original=True, **options)
+            if post_process:
+                post_process(content_path, packagefile, report)
         if report.stats['errors'] > 0:
             if report.errors:
                 message = report.errors[0].message
@@ -845,33 +1852,113 @@ class Submission (object):
         logger.info('Frictionless package valid.')
 
     @classmethod
-    def provision_sqlite(cls, schema_json, sqlite_filename):
-        """Idempotently prepare sqlite database, with givem model and base vocab."""
-        dp = CfdeDataPackage(schema_json)
+    def provision_sqlite(cls, schema_json, sqlite_filename, attach={}, defer_indexes=()):
+        """Idempotently prepare sqlite database, with givem model and base vocab.
+
+        :param schema_json: The model to provision in sqlite_filename.
+        :param sqlite_filename: The main sqlite database file.
+        :param attach: Optional dict of {dbname: (schema_json, dbfilename)} to provision in the same transaction.
+        :param defer_indexes: Optional dbnames from attach to provision without fkey indexes.
+
+        Databases named in defer_indexes should be passed to
+        index_sqlite() after their bulk content is loaded.
+        """
+        dp = cls.canonical_datapackage(schema_json)
+        make_parent_dirs(sqlite_filename, *[ dbfilename for db_schema_json, dbfilename in attach.values() ])
         # this with block produces a transaction in sqlite3
         with sqlite3.connect(sqlite_filename) as conn:
+            for dbname, (db_schema_json, dbfilename) in attach.items():
+                conn.execute("ATTACH DATABASE %s AS %s;" % (sql_literal(dbfilename), sql_identifier(dbname)))
+            sqlite_tune_bulk(conn, ['main'] + list(attach.keys()))
+            # cover DDL and vocab loads with one transaction, committed by with block
+            conn.execute('BEGIN IMMEDIATE;')
             logger.debug('Idempotently provisioning schema in %s' % (sqlite_filename,))
             dp.provision_sqlite(conn)
             dp.sqlite_import_data_files(conn, onconflict='skip')
+            for dbname, (db_schema_json, dbfilename) in attach.items():
+                logger.debug('Idempotently provisioning schema in %s' % (dbfilename,))
+                db_dp = cls.canonical_datapackage(db_schema_json)
+                db_dp.provision_sqlite(conn, schema=dbname, indexes=dbname not in defer_indexes)
+                db_dp.sqlite_import_data_files(conn, onconflict='skip', schema=dbname)
 
     @classmethod
-    def load_sqlite(cls, content_path, sqlite_filename, table_error_callback=None, progress=None, onconflict='skip'):
-        """Idempotently insert submission content."""
+    def load_sqlite(cls, content_path, sqlite_filename, table_error_callback=None, progress=None, onconflict='skip', check_types=False):
+        """Idempotently insert submission content.
+
+        With check_types=True, numeric field values are checked the
+        way frictionless validation would, e.g. when it was skipped.
+
+        Tables are parsed in parallel worker processes unless the
+        CFDE_SQLITE_LOAD_WORKERS environment variable is set to 1 or
+        the resource files total less than load_parallel_min_bytes,
+        where starting the workers would cost more than it saves.
+
+        Whenever this call loads any table, progress['generation'] is
+        set to a new random value, so later phases can tell whether
+        the loaded content changed since they last ran.
+        """
         if progress is None:
             progress = dict()
+        done_before = { k for k, v in progress.items() if v and k != 'generation' }
         packagefile = cls.datapackage_name_from_path(content_path)
-        submitted_dp = CfdeDataPackage(packagefile)
+        submitted_dp = CfdeDataPackage.from_file_cached(packagefile)
+        max_workers = int(os.getenv('CFDE_SQLITE_LOAD_WORKERS', '4'))
+        if max_workers > 1:
+            resource_filenames = [
+                '%s/%s' % (os.path.dirname(packagefile), resource['path'])
+                for resource in submitted_dp.package_def['resources']
+                if 'path' in resource
+            ]
+            total_bytes = sum([ os.path.getsize(fname) for fname in resource_filenames if os.path.isfile(fname) ])
+            if total_bytes < cls.load_parallel_min_bytes:
+                max_workers = 1
+        if max_workers > 1:
+            logger.debug('Idempotently loading data for %s into %s with %d workers' % (content_path, sqlite_filename, max_workers))
+            submitted_dp.sqlite_import_data_files_parallel(
+                sqlite_filename,
+                onconflict=onconflict,
+                table_error_callback=table_error_callback,
+                progress=progress,
+                max_workers=max_workers,
+                check_types=check_types,
+            )
+        else:
+            # collect markers locally since nothing is durable until the whole load commits
+            loaded = dict(progress)
+            # this with block produces a transaction in sqlite3
+            with sqlite3.connect(sqlite_filename) as conn:
+                sqlite_tune_bulk(conn)
+                conn.execute('BEGIN IMMEDIATE;')
+                logger.debug('Idempotently loading data for %s into %s' % (content_path, sqlite_filename))
+                submitted_dp.sqlite_import_data_files(conn, onconflict=onconflict, table_error_callback=table_error_callback, progress=loaded, check_types=check_types)
+            progress.update(loaded)
+        done_after = { k for k, v in progress.items() if v and k != 'generation' }
+        if done_after != done_before or 'generation' not in progress:
+            progress['generation'] = str(uuid.uuid4())
+
+    @classmethod
+    def index_sqlite(cls, schema_json, sqlite_filename):
+        """Idempotently create fkey indexes deferred by provision_sqlite().
+
+        Building each index once over loaded content is much cheaper
+        than maintaining it during the bulk load.
+        """
+        dp = cls.canonical_datapackage(schema_json)
         # this with block produces a transaction in sqlite3
         with sqlite3.connect(sqlite_filename) as conn:
-            logger.debug('Idempotently loading data for %s into %s' % (content_path, sqlite_filename))
-            submitted_dp.sqlite_import_data_files(conn, onconflict=onconflict, table_error_callback=table_error_callback, progress=progress)
+            sqlite_tune_bulk(conn)
+            conn.execute('BEGIN IMMEDIATE;')
+            logger.debug('Idempotently indexing %s' % (sqlite_filename,))
+            dp.provision_sqlite_indexes(conn)
 
     @classmethod
     def sqlite_datapackage_check(cls, schema_json, content_path, sqlite_filename, table_error_callback=None, tablenames=None, progress=None):
-        canonical_dp = CfdeDataPackage(schema_json)
+        canonical_dp = cls.canonical_datapackage(schema_json)
         packagefile = cls.datapackage_name_from_path(content_path)
-        submitted_dp = CfdeDataPackage(packagefile)
+        submitted_dp = CfdeDataPackage.from_file_cached(packagefile)
         with sqlite3.connect(sqlite_filename) as conn:
+            # constraint checks scan and sort whole tables
+            sqlite_tune_bulk(conn)
             logger.debug('Checking database %s for submission %r against schema %r constraints' % (sqlite_filename, content_path, schema_json))
             canonical_dp.check_sqlite_tables(conn, submitted_dp, table_error_callback, tablenames, progress)
 
@@ -949,8 +2036,8 @@ ORDER BY count(*) DESC;
 
     @classmethod
     def _test_get_sqlite_etl_sql(cls):
-        submission_dp = CfdeDataPackage(submission_schema_json)
-        prep_dp = CfdeDataPackage(portal_prep_schema_json)
+        submission_dp = cls.canonical_datapackage(submission_schema_json)
+        prep_dp = cls.canonical_datapackage(portal_prep_schema_json)
         return [
             prep_dp.generate_resource_etl_sql(submission_dp, 'submission', resource)
             for resource in prep_dp.package_def['resources']
@@ -958,24 +2045,41 @@ ORDER BY count(*) DESC;
         ]
 
     @classmethod
-    def prepare_sqlite_derived_data(cls, sqlite_filename, progress=None, attach={}):
+    def prepare_sqlite_derived_data(cls, sqlite_filename, progress=None, attach={}, source_generation=None):
         """Prepare derived content via embedded SQL ETL 
 
         This method will clear and recompute the derived results
-        each time it is invoked.
-
+        each time it is invoked, except for steps already marked done
+        in progress.
+
+        Markers are only honored while source_generation matches the
+        value recorded when the ETL started, so a re-entry with
+        unchanged inputs skips completed work (or the whole ETL) while
+        changed inputs are processed from scratch. Pass the
+        progress['generation'] value(s) recorded by load_sqlite(); the
+        default None always starts from scratch.
         """
         if progress is None:
             progress = dict()
 
-        submission_dp = CfdeDataPackage(submission_schema_json)
-        prep_dp = CfdeDataPackage(portal_prep_schema_json)
+        derived_from = source_generation
+        if derived_from is None or progress.get('derived_from') != derived_from:
+            if len(progress):
+                logger.info('Discarding ETL restart markers for changed source data')
+                progress.clear()
+            progress['derived_from'] = derived_from
+        elif progress.get('complete'):
+            logger.info('Skipping ETL for %s due to restart marker for unchanged source data' % (sqlite_filename,))
+            return
+
+        submission_dp = cls.canonical_datapackage(submission_schema_json)
+        prep_dp = cls.canonical_datapackage(portal_prep_schema_json)
 
         def array_join(j, sep):
             if j is None:
                 return None
             try:
-                a = json.loads(j)
+                a = json_loads(j)
             except Exception as e:
                 logger.error('array_join(%r) JSON decode failed: %s' % (j, e))
                 raise
@@ -991,7 +2095,7 @@ ORDER BY count(*) DESC;
             if j is None:
                 return None
             try:
-                v = json.loads(j)
+                v = json_loads(j)
             except Exception as e:
                 logger.error('json_sorted(%r) JSON decode failed: %s' % (j, e))
                 raise
@@ -999,23 +2103,28 @@ ORDER BY count(*) DESC;
                 logger.error('json_sorted unexpected input %r' % (j,))
                 raise ValueError(j)
             try:
-                v = json.dumps(sorted(v, key=lambda x: (-1 if x is None else x)), separators=(',',':'))
+                v = json_dumps(sorted(v, key=lambda x: (-1 if x is None else x)))
                 return v
             except Exception as e:
                 logger.error('json_sorted(%r) JSON encode failed: %s' % (j, e))
                 raise
 
-        def cfde_keywords_set(*strings):
-            """Downcase and split strings into tokens, remove common junk tokens, merge into set."""
-            def str_split(s):
-                for s2 in re.split('\s|[+/.,;()[\]{}\'"_~%&|]', s.lower()):
-                    s2 = s2.strip('-:+/.,;()[]{}\'"~%&|')
-                    if s2 not in {
-                            '', 'an', 'the', 'of', 'as', 'at', 'to', 'on',
-                            'or', 'and', 'is', 'by', 'not', 'from', 'are',
-                    } and len(s2) > 1:
+        # vocabulary names and descriptions repeat across many ETL rows, so tokenize each distinct string once
+        @functools.lru_cache(maxsize=65536)
+        def str_split(s):
+            """Downcase and split one string into a set of tokens, without common junk tokens."""
+            def tokens():
+                for s2 in _keyword_split_re.split(s.lower()):
+                    # stripping only shortens tokens, so skip the many empty splits up front
+                    if len(s2) < 2:
+                        continue
+                    s2 = s2.strip(_keyword_strip_chars)
+                    if len(s2) > 1 and s2 not in _keyword_stopwords:
                         yield s2
+            return frozenset(tokens())
 
+        def cfde_keywords_set(*strings):
+            """Downcase and split strings into tokens, remove common junk tokens, merge into set."""
             kw = set()
             for s in strings:
                 if s is None:
@@ -1026,7 +2135,19 @@ ORDER BY count(*) DESC;
         def cfde_keywords(*strings):
             """Downcase and split strings into tokens, remove common junk tokens, merge into sorted JSON array."""
             kw = cfde_keywords_set(*strings)
-            return json.dumps(sorted(kw), separators=(',',':'))
+            return json_dumps(sorted(kw))
+
+        # the same per-vocabulary keyword arrays are merged into many rows, so decode each distinct one once
+        @functools.lru_cache(maxsize=65536)
+        def keywords_array_set(a):
+            """Decode one JSON keyword array (or string) into a set."""
+            v = json_loads(a)
+            if isinstance(v, str):
+                return frozenset({v})
+            elif isinstance(v, list):
+                return frozenset(v)
+            else:
+                raise TypeError(a)
 
         def cfde_keywords_merge_set(*arrays):
             """Merge JSON arrays of keywords into one set."""
@@ -1034,20 +2155,14 @@ ORDER BY count(*) DESC;
             for a in arrays:
                 if a is None:
                     continue
-                v = json.loads(a)
-                if isinstance(v, str):
-                    kw.add(v)
-                elif isinstance(v, list):
-                    kw.update(v)
-                else:
-                    raise TypeError(a)
+                kw.update(keywords_array_set(a))
             kw.difference_update({None,})
             return kw
 
         def cfde_keywords_merge(*arrays):
             """Merge JSON arrays of keywords into one sorted JSON array."""
             kw = cfde_keywords_merge_set(*arrays)
-            return json.dumps(sorted(kw), separators=(',',':'))
+            return json_dumps(sorted(kw))
 
         class cfde_keywords_agg(object):
             """Like cfde_keywords() but merge each call in aggregate"""
@@ -1056,7 +2171,7 @@ ORDER BY count(*) DESC;
             def step(self, *strings):
                 self.kw.update(cfde_keywords_set(*strings))
             def finalize(self):
-                return json.dumps(sorted(self.kw), separators=(',',':'))
+                return json_dumps(sorted(self.kw))
 
         class cfde_keywords_merge_agg(object):
             """Like cfde_keywords_merge() but merge each call in aggregate"""
@@ -1065,7 +2180,7 @@ ORDER BY count(*) DESC;
             def step(self, *arrays):
                 self.kw.update(cfde_keywords_merge_set(*arrays))
             def finalize(self):
-                return json.dumps(sorted(self.kw), separators=(',',':'))
+                return json_dumps(sorted(self.kw))
 
         # this with block produces a transaction in sqlite3
         sqlite3.enable_callback_tracebacks(True)
@@ -1073,18 +2188,28 @@ ORDER BY count(*) DESC;
             logger.debug('Building derived data in %s' % (sqlite_filename,))
             for dbname, dbfilename in attach.items():
                 conn.execute("ATTACH DATABASE %s AS %s;" % (sql_literal(dbfilename), sql_identifier(dbname)))
-            conn.create_function('array_join', 2, array_join)
-            conn.create_function('json_sorted', 1, json_sorted)
-            conn.create_function('cfde_keywords', -1, cfde_keywords)
-            conn.create_function('cfde_keywords_merge', -1, cfde_keywords_merge)
+            # ETL steps commit individually to match their progress markers
+            sqlite_tune_bulk(conn, ['main'] + list(attach.keys()))
+            # deterministic functions let sqlite evaluate invariant calls once per statement
+            conn.create_function('array_join', 2, array_join, deterministic=True)
+            conn.create_function('json_sorted', 1, json_sorted, deterministic=True)
+            conn.create_function('cfde_keywords', -1, cfde_keywords, deterministic=True)
+            conn.create_function('cfde_keywords_merge', -1, cfde_keywords_merge, deterministic=True)
             conn.create_aggregate('cfde_keywords_agg', -1, cfde_keywords_agg)
             conn.create_aggregate('cfde_keywords_merge_agg', -1, cfde_keywords_merge_agg)
             conn.set_trace_callback(logger.debug)
             prep_dp.sqlite_do_etl(conn, submission_dp, 'submission', progress=progress)
+        progress['complete'] = True
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _catalog_url_re(server_uri):
+        """Return compiled regex matching catalog URLs on server_uri."""
+        return re.compile('%s/ermrest/catalog/(?P<catalog>[^/]+)/?' % re.escape(server_uri))
 
     @classmethod
     def extract_catalog_id(cls, server, catalog_url):
-        m = re.match('%s/ermrest/catalog/(?P<catalog>[^/]+)/?' % server.get_server_uri(), catalog_url)
+        m = cls._catalog_url_re(server.get_server_uri()).match(catalog_url)
         if m:
             catalogid = m.groupdict()['catalog']
         else:
@@ -1143,23 +2268,105 @@ ORDER BY count(*) DESC;
         """Idempotently upload (augmented) datapackage content in sqlite db into review catalog."""
         if progress is None:
             progress = dict()
-        with sqlite3.connect(sqlite_filename) as conn:
-            logger.debug('Idempotently uploading derived ETL data from %s' % (sqlite_filename,))
-            canon_dp = CfdeDataPackage(portal_schema_json)
-            canon_dp.set_catalog(catalog)
-            canon_dp.load_sqlite_tables(conn, onconflict='skip', table_done_callback=table_done_callback, table_error_callback=table_error_callback, progress=progress)
+        logger.debug('Idempotently uploading derived ETL data from %s' % (sqlite_filename,))
+        canon_dp = cls.canonical_datapackage(portal_schema_json).for_catalog(catalog)
+        tables = canon_dp.doc_cfde_schema.tables.values()
+        cls.upload_sqlite_tables(canon_dp, sqlite_filename, tables, table_done_callback, table_error_callback, progress)
 
     @classmethod
     def upload_sqlite_raw_content(cls, catalog, sqlite_filename, table_done_callback=None, table_error_callback=None, progress=None):
         """Idempotently upload orignal datapackage content in sqlite db into review catalog."""
         if progress is None:
             progress = dict()
-        with sqlite3.connect(sqlite_filename) as conn:
-            logger.debug('Idempotently uploading raw data from %s' % (sqlite_filename,))
-            canon_dp = CfdeDataPackage(portal_schema_json)
-            canon_dp.set_catalog(catalog)
-            tables = canon_dp.doc_model_root.schemas['c2m2'].tables.values()
-            canon_dp.load_sqlite_tables(conn, onconflict='skip', tables=tables, table_done_callback=table_done_callback, table_error_callback=table_error_callback, progress=progress)
+        logger.debug('Idempotently uploading raw data from %s' % (sqlite_filename,))
+        canon_dp = cls.canonical_datapackage(portal_schema_json).for_catalog(catalog)
+        tables = canon_dp.doc_model_root.schemas['c2m2'].tables.values()
+        cls.upload_sqlite_tables(canon_dp, sqlite_filename, tables, table_done_callback, table_error_callback, progress)
+
+    @classmethod
+    def upload_sqlite_all_content(cls, catalog, raw_sqlite_filename, sqlite_filename, table_done_callback=None, table_error_callback=None, raw_progress=None, progress=None):
+        """Idempotently upload original and (augmented) datapackage content into review catalog.
+
+        Equivalent to upload_sqlite_raw_content() followed by
+        upload_sqlite_content(), but as one upload plan, so CFDE
+        tables which do not reference c2m2 tables are uploaded
+        concurrently with the raw content.
+        """
+        if raw_progress is None:
+            raw_progress = dict()
+        if progress is None:
+            progress = dict()
+        logger.debug('Idempotently uploading raw data from %s and derived ETL data from %s' % (raw_sqlite_filename, sqlite_filename))
+        canon_dp = cls.canonical_datapackage(portal_schema_json).for_catalog(catalog)
+        cls.upload_sqlite_sources(
+            canon_dp,
+            [
+                (raw_sqlite_filename, canon_dp.doc_model_root.schemas['c2m2'].tables.values(), raw_progress),
+                (sqlite_filename, canon_dp.doc_cfde_schema.tables.values(), progress),
+            ],
+            table_done_callback,
+            table_error_callback,
+        )
+
+    @classmethod
+    def upload_sqlite_tables(cls, canon_dp, sqlite_filename, tables, table_done_callback=None, table_error_callback=None, progress=None):
+        """Upload sqlite tables into canon_dp's catalog, overlapping independent tables.
+
+        Same as upload_sqlite_sources() with a single source.
+        """
+        cls.upload_sqlite_sources(canon_dp, [(sqlite_filename, tables, progress)], table_done_callback, table_error_callback)
+
+    @classmethod
+    def upload_sqlite_sources(cls, canon_dp, sources, table_done_callback=None, table_error_callback=None):
+        """Upload tables from several sqlite files into canon_dp's catalog, overlapping independent tables.
+
+        :param canon_dp: The CfdeDataPackage bound to the destination catalog.
+        :param sources: List of (sqlite_filename, tables, progress) upload sources.
+        :param table_done_callback: Optional callback, lambda tname, path: ...
+        :param table_error_callback: Optional callback, lambda tname, path, diagnostics: ...
+
+        Tables are uploaded level by level in foreign key dependency
+        order across all sources, with the tables of one level sent
+        concurrently by worker threads each reading through its own
+        sqlite connection. Set CFDE_UPLOAD_WORKERS=1 to upload one
+        table at a time. Callbacks are serialized, so they need not be
+        thread-safe.
+        """
+        callback_lock = threading.Lock()
+        def serialized(callback):
+            if callback is None:
+                return None
+            def wrapper(*args):
+                with callback_lock:
+                    return callback(*args)
+            return wrapper
+        table_done_callback = serialized(table_done_callback)
+        table_error_callback = serialized(table_error_callback)
+
+        table_sources = {
+            (table.schema.name, table.name): (sqlite_filename, progress)
+            for sqlite_filename, tables, progress in sources
+            for table in tables
+        }
+        tables = [ table for sqlite_filename, tables, progress in sources for table in tables ]
+
+        def upload_table(table):
+            sqlite_filename, progress = table_sources[(table.schema.name, table.name)]
+            with sqlite3.connect(sqlite_filename) as conn:
+                sqlite_tune_bulk(conn)
+                canon_dp.load_sqlite_tables(conn, onconflict='skip', tables=[table], table_done_callback=table_done_callback, table_error_callback=table_error_callback, progress=progress)
+
+        max_workers = int(os.getenv('CFDE_UPLOAD_WORKERS', '4'))
+        if max_workers <= 1:
+            for table in tables_topo_sorted(tables):
+                upload_table(table)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for level in tables_topo_levels(tables):
+                # finish each level before starting tables which reference it
+                for future in [ pool.submit(upload_table, table) for table in level ]:
+                    future.result()
 
     @classmethod
     def download_resource_markdown_to_sqlite(cls, registry, portal_prep_filename):
@@ -1168,65 +2375,75 @@ ORDER BY count(*) DESC;
         :param registry: The Registry instance for the submission system
         :param portal_prep_filename: The sqlite3 file for the loaded and ETL'd submission content.
         """
-        registry_dp = CfdeDataPackage(registry_schema_json)
-        registry_dp.set_catalog(registry._catalog)
+        registry_dp = cls.canonical_datapackage(registry_schema_json).for_catalog(registry._catalog)
 
+        # this with block produces a transaction in sqlite3
         with sqlite3.connect(portal_prep_filename) as conn:
+            sqlite_tune_bulk(conn)
+            # cover all vocabulary updates with one transaction, committed by with block
+            conn.execute('BEGIN IMMEDIATE;')
             cur = conn.cursor()
-            logger.info('Retrieving registry vocabulary resource_markdown content...')
-            for table in registry_dp.cat_cfde_schema.tables.values():
-                # skip tables that don't have right structure in registry
-                if {'id', 'name', 'description', 'resource_markdown'} - set(table.columns.elements.keys()):
-                    continue
-
-                # skip tables that don't have right structure in sqlite
-                cur.execute("""
-SELECT true
-FROM sqlite_master t
-JOIN pragma_table_info(%(tname)s) c ON (True)
-WHERE t.type = 'table'
-  AND t.name = %(tname)s
-  AND c.name = 'resource_markdown';
-""" % {
-    'tname': sql_literal(table.name),
-})
-                found = cur.fetchone()
-                if found is None:
-                    continue
-
-                cur.executescript("""
+            cur.execute("""
 CREATE TEMP TABLE IF NOT EXISTS temp_resource_markdown (
   id text PRIMARY KEY,
   resource_markdown text
 );
-DELETE FROM temp_resource_markdown;
 """)
-                def get_batches():
-                    after = ''
+            # find sqlite tables with the right structure in one schema scan
+            cur.execute("""
+SELECT t.name
+FROM sqlite_master t
+JOIN pragma_table_info(t.name) c ON (True)
+WHERE t.type = 'table'
+  AND c.name = 'resource_markdown';
+""")
+            sqlite_tnames = { row[0] for row in cur.fetchall() }
+            required_cnames = {'id', 'name', 'description', 'resource_markdown'}
+            tables = [
+                table
+                for table in registry_dp.cat_cfde_schema.tables.values()
+                # skip tables that don't have right structure in registry or sqlite
+                if table.name in sqlite_tnames and required_cnames.issubset(table.columns.elements.keys())
+            ]
+            page_size = 500
+
+            def get_page(tname, after=''):
+                return registry_dp.catalog.get(
+                    '/attribute/CFDE:%s/!resource_markdown::null::/id,resource_markdown@sort(id)%s?limit=%d' % (
+                        urlquote(tname),
+                        after,
+                        page_size,
+                    )
+                ).text
+
+            logger.info('Retrieving registry vocabulary resource_markdown content...')
+            # one background fetch keeps the next page in flight while sqlite stores this one
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+                pending = pool.submit(get_page, tables[0].name) if tables else None
+                for i, table in enumerate(tables):
+                    # not executescript(), which would commit each table separately
+                    cur.execute("DELETE FROM temp_resource_markdown;")
                     while True:
-                        rows = registry_dp.catalog.get(
-                            '/attribute/CFDE:%s/!resource_markdown::null::/id,resource_markdown@sort(id)%s?limit=500' % (
-                                urlquote(table.name),
-                                after,
-                            )
-                        ).json()
-                        if rows:
-                            after = '@after(%s)' % (urlquote(rows[-1]['id']),)
-                            yield rows
+                        page = pending.result()
+                        # page length and last key in server sort order, without decoding the response in python
+                        cur.execute("""
+SELECT json_array_length(?), (SELECT json_extract(j.value, '$.id') FROM json_each(?) j ORDER BY j.key DESC LIMIT 1);
+""", (page, page))
+                        nrows, last_id = cur.fetchone()
+                        if nrows < page_size:
+                            # a short page is the last one, so move on to the next table
+                            pending = pool.submit(get_page, tables[i+1].name) if i + 1 < len(tables) else None
                         else:
+                            pending = pool.submit(get_page, table.name, '@after(%s)' % (urlquote(last_id),))
+                        # bind the JSON response array as one parameter and let sqlite unpack it
+                        cur.execute("""
+INSERT INTO temp_resource_markdown (id, resource_markdown)
+SELECT json_extract(j.value, '$.id'), json_extract(j.value, '$.resource_markdown')
+FROM json_each(?) j;
+""", (page,))
+                        if nrows < page_size:
                             break
-
-                for batch in get_batches():
                     cur.execute("""
-INSERT INTO temp_resource_markdown (id, resource_markdown)
-VALUES %(values)s;
-""" % {
-    'values': ', '.join([
-        '(%s, %s)' % (sql_literal(row['id']), sql_literal(row['resource_markdown']))
-        for row in batch
-    ])
-})
-                cur.execute("""
 UPDATE %(tname)s AS v
 SET resource_markdown = t.resource_markdown
 FROM temp_resource_markdown t
@@ -1234,9 +2451,9 @@ WHERE v.id = t.id;
 """ % {
     'tname': sql_identifier(table.name),
 })
-                cur.execute("SELECT count(*) FROM temp_resource_markdown;")
-                nrows = cur.fetchone()[0]
-                logger.info('Stored resource_markdown for %s rows of %r' % (nrows, table.name,))
+                    cur.execute("SELECT count(*) FROM temp_resource_markdown;")
+                    nrows = cur.fetchone()[0]
+                    logger.info('Stored resource_markdown for %s rows of %r' % (nrows, table.name,))
 
     @classmethod
     def record_vocab_usage(cls, registry, portal_prep_filename, id):
@@ -1253,11 +2470,22 @@ WHERE v.id = t.id;
                 batch = cur.fetchmany()
 
         catalog = registry._catalog
+
+        def recorded_terms(dst_tname, dst_cname):
+            return {
+                row[dst_cname]
+                for row in catalog.get('/attribute/CFDE:%s/datapackage=%s/%s' % (
+                        urlquote(dst_tname),
+                        urlquote(id),
+                        urlquote(dst_cname),
+                )).json()
+            }
+
         # HACK: use registry schema to load same tables that exist in registry
-        registry_dp = CfdeDataPackage(registry_schema_json)
-        registry_dp.set_catalog(catalog)
+        registry_dp = cls.canonical_datapackage(registry_schema_json).for_catalog(catalog)
 
         with sqlite3.connect(portal_prep_filename) as conn:
+            sqlite_tune_bulk(conn)
             logger.info('Augmenting registry vocabulary tables...')
             registry_dp.load_sqlite_tables(
                 conn,
@@ -1297,37 +2525,37 @@ WHERE v.id = t.id;
             cur.arraysize = CfdeDataPackage.batch_size
             for src_sql, dst_tname, dst_cname in [
                     ("""  SELECT v.id FROM biosample e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN anatomy v ON (cf.anatomy = v.nid)
-                    UNION SELECT v.id FROM collection_anatomy a JOIN anatomy v ON (a.anatomy = v.nid)""",
+                    UNION ALL SELECT v.id FROM collection_anatomy a JOIN anatomy v ON (a.anatomy = v.nid)""",
                      'datapackage_anatomy', 'anatomy'),
                     ('SELECT v.id FROM biosample e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN sample_prep_method v ON (cf.sample_prep_method = v.nid)',
                      'datapackage_sample_prep_method', 'sample_prep_method'),
                     ("""  SELECT v.id FROM biosample e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN assay_type v ON (cf.assay_type = v.nid)
-                    UNION SELECT v.id FROM file e      JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN assay_type v ON (cf.assay_type = v.nid)""",
+                    UNION ALL SELECT v.id FROM file e      JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN assay_type v ON (cf.assay_type = v.nid)""",
                      'datapackage_assay_type', 'assay_type'),
                     ('SELECT v.id FROM file e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN data_type v ON (cf.data_type = v.nid)',
                      'datapackage_data_type', 'data_type'),
                     ('SELECT v.id FROM file e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN dbgap_study_id v ON (cf.dbgap_study_id = v.nid)',
                      'datapackage_dbgap_study_id', 'dbgap_study_id'),
                     ("""  SELECT v.id FROM subject_disease a    JOIN disease v ON (a.disease = v.nid)
-                    UNION SELECT v.id FROM biosample_disease a  JOIN disease v ON (a.disease = v.nid)
-                    UNION SELECT v.id FROM collection_disease a JOIN disease v ON (a.disease = v.nid)""",
+                    UNION ALL SELECT v.id FROM biosample_disease a  JOIN disease v ON (a.disease = v.nid)
+                    UNION ALL SELECT v.id FROM collection_disease a JOIN disease v ON (a.disease = v.nid)""",
                      'datapackage_disease', 'disease'),
                     ("""  SELECT v1.id FROM subject_substance a   JOIN substance v2 ON (a.substance = v2.nid) JOIN compound v1 ON (v2.compound = v1.nid)
-                    UNION SELECT v1.id FROM biosample_substance a JOIN substance v2 ON (a.substance = v2.nid) JOIN compound v1 ON (v2.compound = v1.nid)
-                    UNION SELECT v1.id FROM collection_substance a JOIN substance v2 ON (a.substance = v2.nid) JOIN compound v1 ON (v2.compound = v1.nid)
-                    UNION SELECT v1.id FROM collection_compound a JOIN compound v1 ON (a.compound = v1.nid)""",
+                    UNION ALL SELECT v1.id FROM biosample_substance a JOIN substance v2 ON (a.substance = v2.nid) JOIN compound v1 ON (v2.compound = v1.nid)
+                    UNION ALL SELECT v1.id FROM collection_substance a JOIN substance v2 ON (a.substance = v2.nid) JOIN compound v1 ON (v2.compound = v1.nid)
+                    UNION ALL SELECT v1.id FROM collection_compound a JOIN compound v1 ON (a.compound = v1.nid)""",
                      'datapackage_compound', 'compound'),
                     ("""  SELECT v2.id FROM subject_substance a   JOIN substance v2 ON (a.substance = v2.nid)
-                    UNION SELECT v2.id FROM biosample_substance a JOIN substance v2 ON (a.substance = v2.nid)
-                    UNION SELECT v2.id FROM collection_substance a JOIN substance v2 ON (a.substance = v2.nid)""",
+                    UNION ALL SELECT v2.id FROM biosample_substance a JOIN substance v2 ON (a.substance = v2.nid)
+                    UNION ALL SELECT v2.id FROM collection_substance a JOIN substance v2 ON (a.substance = v2.nid)""",
                      'datapackage_substance', 'substance'),
                     ("""SELECT v.id FROM file e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN file_format v ON (cf.file_format = v.nid)
-                    UNION SELECT v.id FROM file e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN file_format v ON (cf.compression_format = v.nid)""",
+                    UNION ALL SELECT v.id FROM file e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN file_format v ON (cf.compression_format = v.nid)""",
                      'datapackage_file_format', 'file_format'),
                     ('SELECT v.id FROM file e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN mime_type v ON (cf.mime_type = v.nid)',
                      'datapackage_mime_type', 'mime_type'),
                     ("""  SELECT v.id FROM subject_role_taxonomy a JOIN ncbi_taxonomy v ON (a.taxon = v.nid)
-                    UNION SELECT v.id FROM collection_taxonomy a JOIN ncbi_taxonomy v ON (a.taxon = v.nid)""",
+                    UNION ALL SELECT v.id FROM collection_taxonomy a JOIN ncbi_taxonomy v ON (a.taxon = v.nid)""",
                      'datapackage_ncbi_taxonomy', 'ncbi_taxonomy'),
                     ('SELECT v.id FROM subject e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN subject_granularity v ON (cf.subject_granularity = v.nid)',
                      'datapackage_subject_granularity', 'subject_granularity'),
@@ -1340,33 +2568,38 @@ WHERE v.id = t.id;
                     ('SELECT v.id FROM subject_role_taxonomy a JOIN subject_role v ON (a.role = v.nid)',
                      'datapackage_subject_role', 'subject_role'),
                     ("""  SELECT v.id FROM biosample_gene a JOIN gene v ON (a.gene = v.nid)
-                    UNION SELECT v.id FROM collection_gene a JOIN gene v ON (a.gene = v.nid)
-                    UNION SELECT v.id FROM protein_gene a JOIN gene v ON (a.gene = v.nid)""",
+                    UNION ALL SELECT v.id FROM collection_gene a JOIN gene v ON (a.gene = v.nid)
+                    UNION ALL SELECT v.id FROM protein_gene a JOIN gene v ON (a.gene = v.nid)""",
                      'datapackage_gene', 'gene'),
                     ("""  SELECT v.id FROM collection_protein a JOIN protein v ON (a.protein = v.nid)
-                    UNION SELECT v.id FROM protein_gene a JOIN protein v ON (a.protein = v.nid)
+                    UNION ALL SELECT v.id FROM protein_gene a JOIN protein v ON (a.protein = v.nid)
                     """,
                      'datapackage_protein', 'protein'),
                     ('SELECT v.id FROM file e JOIN core_fact cf ON (e.core_fact = cf.nid) JOIN analysis_type v ON (cf.analysis_type = v.nid)',
                      'datapackage_analysis_type', 'analysis_type'),
                     ("""  SELECT v.id FROM subject_phenotype a    JOIN phenotype v ON (a.phenotype = v.nid)
-                    UNION SELECT v.id FROM collection_phenotype a JOIN phenotype v ON (a.phenotype = v.nid)""",
+                    UNION ALL SELECT v.id FROM collection_phenotype a JOIN phenotype v ON (a.phenotype = v.nid)""",
                      'datapackage_phenotype', 'phenotype'),
                     ("""  SELECT v.id FROM subject_disease a   JOIN disease_association_type v ON (a.association_type = v.nid)
-                    UNION SELECT v.id FROM biosample_disease a JOIN disease_association_type v ON (a.association_type = v.nid)""",
+                    UNION ALL SELECT v.id FROM biosample_disease a JOIN disease_association_type v ON (a.association_type = v.nid)""",
                      'datapackage_disease_association_type', 'disease_association_type'),
                     ('SELECT v.id FROM subject_phenotype a JOIN phenotype_association_type v ON (a.association_type = v.nid)',
                      'datapackage_phenotype_association_type', 'phenotype_association_type'),
             ]:
                 try:
+                    # branches are UNION ALL, so the one DISTINCT here is the only dedupe pass
                     cur.execute("""
 SELECT DISTINCT id FROM (%(src_sql)s) s
 WHERE id IS NOT NULL
 """ % {
     "src_sql": src_sql,
 })
+                    # one lookup per table, e.g. so a rebuild only posts terms not yet recorded
+                    recorded = recorded_terms(dst_tname, dst_cname)
                     for batch in get_batches(cur):
-                        batch = [ { "datapackage": id, dst_cname: row[0] } for row in batch ]
+                        batch = [ { "datapackage": id, dst_cname: row[0] } for row in batch if row[0] not in recorded ]
+                        if not batch:
+                            continue
                         entity_url = "/entity/CFDE:%s?onconflict=skip" % (urlquote(dst_tname),)
                         r = catalog.post(entity_url, json=batch)
                         logger.info("Batch of terms for %s recorded" % dst_tname)
@@ -1387,10 +2620,12 @@ WHERE id IS NOT NULL
             skip_dcc_check=True,
         )
         if purge_partial:
-            for path in [submission.ingest_sqlite_filename, submission.portal_prep_sqlite_filename]:
-                if os.path.exists(path):
-                    logger.info('Purging %s' % path)
-                    os.remove(path)
+            for dbname in [submission.ingest_sqlite_filename, submission.portal_prep_sqlite_filename, submission.progress_sqlite_filename]:
+                # WAL-mode databases leave companion files which must go too
+                for path in [dbname, dbname + '-wal', dbname + '-shm']:
+                    if os.path.exists(path):
+                        logger.info('Purging %s' % path)
+                        os.remove(path)
 
             ermrest_url = registry.get_datapackage(id).get('review_ermrest_url')
             if ermrest_url is not None:
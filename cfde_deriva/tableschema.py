@@ -95,9 +95,13 @@ terms = _attrdict_from_strings(
 
 # some special singleton strings...
 class PackageDataName (object):
+    # small, immutable model and SQL resources are memoized per process
+    cached_suffixes = ('.json', '.sql')
+
     def __init__(self, package, filename):
         self.package = package
         self.filename = filename
+        self._data_cache = dict()
 
     def __str__(self):
         return self.filename
@@ -115,9 +119,21 @@ class PackageDataName (object):
 
         any unrecognized suffix is returned without interpretation.
 
+        Content with a suffix in cached_suffixes is loaded (and for
+        subclasses, generated) only once.
+
         """
         if key is None:
             key = self.filename
+        if not key.endswith(self.cached_suffixes):
+            return self.load_data(key, decompress)
+        buf = self._data_cache.get( (key, decompress) )
+        if buf is None:
+            buf = self._data_cache[(key, decompress)] = self.load_data(key, decompress)
+        return buf
+
+    def load_data(self, key, decompress=True):
+        """Load named content as raw buffer, bypassing the get_data() cache"""
         buf = pkgutil.get_data(self.package.__name__, key)
         if decompress:
             if key.endswith('.gz'):
@@ -143,10 +159,8 @@ class PackageDataName (object):
 submission_schema_json = PackageDataName(submission, 'c2m2-datapackage.json')
 
 class ConstituentPackageDataName (PackageDataName):
-    def get_data(self, key=None, decompress=True):
-        if key is None:
-            key = self.filename
-        buf = super(ConstituentPackageDataName, self).get_data(key, decompress=decompress)
+    def load_data(self, key, decompress=True):
+        buf = super(ConstituentPackageDataName, self).load_data(key, decompress=decompress)
         if key != self.filename:
             return buf
         # prune CV name uniqueness from C2M2 submission schema
@@ -168,7 +182,7 @@ class ConstituentPackageDataName (PackageDataName):
                 continue
             cdocs['name'].get('constraints', {}).pop('unique', None)
 
-        # return as UTF8 bytes to meet get_data() method signature...
+        # return as UTF8 bytes to meet load_data() method signature...
         return json.dumps(doc).encode('utf8')
 
 constituent_schema_json = ConstituentPackageDataName(submission, 'c2m2-datapackage.json')
@@ -176,10 +190,8 @@ portal_prep_schema_json = PackageDataName(portal_prep, 'cfde-portal-prep.json')
 registry_schema_json = PackageDataName(registry, 'cfde-registry-model.json')
 
 class PortalPackageDataName (PackageDataName):
-    def get_data(self, key=None, decompress=True):
-        if key is None:
-            key = self.filename
-        buf = super(PortalPackageDataName, self).get_data(key, decompress=decompress)
+    def load_data(self, key, decompress=True):
+        buf = super(PortalPackageDataName, self).load_data(key, decompress=decompress)
         if key != self.filename:
             return buf
         # augment the portal model we return w/ c2m2 submission tables
@@ -254,7 +266,7 @@ class PortalPackageDataName (PackageDataName):
             # add to portal table list
             portal_resources.append(resource)
 
-        # return as UTF8 bytes to meet get_data() method signature...
+        # return as UTF8 bytes to meet load_data() method signature...
         return json.dumps(portal_doc).encode('utf8')
 
 portal_schema_json = PortalPackageDataName(portal, 'cfde-portal.json')
@@ -0,0 +1,56 @@
+import csv
+import io
+import unittest
+
+from cfde_deriva.datapackage import CfdeDataPackage, pyarrow
+
+
+def csv_rows(data):
+    reader = csv.reader(io.StringIO(data.decode('utf8'), newline=''), delimiter='\t', skipinitialspace=True)
+    next(reader)
+    return [ tuple(row) for row in reader ]
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class TestTsvArrowParity(unittest.TestCase):
+
+    def arrow_rows(self, data):
+        # tsv_arrow_batches() only needs class-level settings
+        dp = CfdeDataPackage.__new__(CfdeDataPackage)
+        return [
+            row
+            for batch in dp.tsv_arrow_batches(pyarrow.BufferReader(data), ['a', 'b'], 'test.tsv')
+            for row in batch
+        ]
+
+    def assertParity(self, data):
+        self.assertTrue(CfdeDataPackage.tsv_arrow_compatible(data))
+        self.assertEqual(self.arrow_rows(data), csv_rows(data))
+
+    def assertIncompatible(self, data):
+        self.assertFalse(CfdeDataPackage.tsv_arrow_compatible(data))
+
+    def test_plain(self):
+        self.assertParity(b'a\tb\nx\ty\n\tz\n')
+        self.assertParity(b'a\tb\r\nx\ty\r\n')
+
+    def test_space_prefixed(self):
+        self.assertParity(b'a\tb\n  x\t y \n')
+
+    def test_inner_quotes(self):
+        self.assertParity(b'a\tb\nx"y\tz "q"\n')
+
+    def test_quoted_fields(self):
+        self.assertIncompatible(b'a\tb\n"x"\ty\n')
+        self.assertIncompatible(b'a\tb\nx\t "spq"\n')
+        self.assertIncompatible(b'a\tb\nx\t"  inner"\n')
+        self.assertIncompatible(b'a\tb\n"x\ny"\tz\n')
+
+    def test_blank_lines(self):
+        self.assertIncompatible(b'a\tb\nx\ty\n\nz\tw\n')
+        self.assertIncompatible(b'a\tb\r\n\r\nz\tw\r\n')
+        self.assertIncompatible(b'a\tb\r\rz\tw\r')
+
+
+if __name__ == '__main__':
+    unittest.main()